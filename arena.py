@@ -0,0 +1,354 @@
+import random
+from simulation import BALL_SIZE, BAR_WIDTH, BAR_HEIGHT, BALL_START, BAR_START_Y, BLUE_BAR_X, RED_BAR_X, SERVE_SPEEDS, TARGET_POINT, \
+    WAIT_POINT, DEFAULT_AI, BALL_TOP_MIN, BALL_TOP_MAX, FIELD_WIDTH, FIELD_HEIGHT, MAX_SWEEP_CONTACTS, WALL, \
+    BallState, BarState, contact_time, wall_contact_time, overlaps, predict_arrival
+
+# Arena mode: the rules of a match with many balls at the same time and power-ups to pick, headless like simulation.Match
+# Every ball bounces on the walls, the bars and the other balls, and a goal takes the ball out of the arena (a new one
+# is served when there are less than min_balls)
+# Power-ups show up in the middle of the pitch, the ball that touches one gets its effect:
+#   multiball: two more balls come out of it
+#   fast / slow: its horizontal speed changes
+#
+# Collision candidates come from a SpatialHash: a uniform grid over the pitch where each ball is put in the cell of its
+# position, so a bar, a power-up or a ball only tests the balls in the cells around it instead of every ball
+# The AI of each bar goes to the predicted arrival of the ball that gets to it first
+
+CELL_SIZE = BALL_SIZE # Every inserted item must fit in a cell, smaller cells have less balls to test
+MAX_BALLS = 1024
+SERVE_VY = (-1, 1) # The served balls go to a random direction, so they don't all stack on the same line
+POWERUP_SIZE = 7
+POWERUP_KINDS = ('multiball', 'fast', 'slow')
+POWERUP_INTERVAL = (120, 300) # Ticks between power-ups
+POWERUP_AREA = (60, 140) # x range they show up in, away from the bars
+MAX_POWERUPS = 3
+MULTIBALL_VY = (-0.75, 0.75) # Added to the vy of the two new balls
+FAST_FACTOR = 1.5
+SLOW_FACTOR = 0.75
+MIN_SPEED = 1 # Slowest horizontal speed left by a slow power-up
+
+# Items are put in the cell of their top-left corner only, so inserting is a single append and every pair of items that
+# may overlap is in the same cell or in neighbor cells, as long as the items aren't bigger than a cell
+# A query for a rect must be grown up and left by the size of the items it looks for
+class SpatialHash:
+    def __init__(self, width: int = FIELD_WIDTH, height: int = FIELD_HEIGHT, cell_size: int = CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.cells = [[] for i in range(self.columns * self.rows)]
+        self.used = [] # Indexes of the cells with items, so clearing doesn't go through the empty ones
+
+    def clear(self):
+        cells = self.cells
+        for index in self.used:
+            cells[index].clear()
+        self.used.clear()
+
+    # Items out of the grid go to the border cells
+    def insert(self, item, x: float, y: float):
+        size = self.cell_size
+        column = min(max(int(x) // size, 0), self.columns - 1)
+        row = min(max(int(y) // size, 0), self.rows - 1)
+        cell = self.cells[row * self.columns + column]
+        if not cell:
+            self.used.append(row * self.columns + column)
+        cell.append(item)
+
+    # Every item inserted at a point of the cells the rect touches
+    def query(self, x: float, y: float, width: float, height: float) -> list:
+        size = self.cell_size
+        first_column = min(max(int(x) // size, 0), self.columns - 1)
+        last_column = min(max(int(x + width) // size, 0), self.columns - 1)
+        first_row = min(max(int(y) // size, 0), self.rows - 1)
+        last_row = min(max(int(y + height) // size, 0), self.rows - 1)
+        cells = self.cells
+        items = []
+        for row in range(first_row, last_row + 1):
+            start = row * self.columns
+            for index in range(start + first_column, start + last_column + 1):
+                items.extend(cells[index])
+        return items
+
+    # Every pair of items in the same cell or in neighbor cells, each pair once
+    # Only half of the neighbors (right, and the three below) are looked at from each cell, the other half looks back
+    def pairs(self) -> list:
+        cells = self.cells
+        columns = self.columns
+        last_row = self.rows - 1
+        pairs = []
+        for index in self.used:
+            cell = cells[index]
+            count = len(cell)
+            for i in range(count - 1):
+                a = cell[i]
+                for j in range(i + 1, count):
+                    pairs.append((a, cell[j]))
+
+            column = index % columns
+            neighbors = []
+            if column < columns - 1:
+                neighbors.append(index + 1)
+            if index // columns < last_row:
+                if column > 0:
+                    neighbors.append(index + columns - 1)
+                neighbors.append(index + columns)
+                if column < columns - 1:
+                    neighbors.append(index + columns + 1)
+            for neighbor in neighbors:
+                other = cells[neighbor]
+                if other:
+                    for a in cell:
+                        for b in other:
+                            pairs.append((a, b))
+        return pairs
+
+class ArenaBall(BallState):
+    __slots__ = ('owner', 'arrival_side', 'arrival_time', 'arrival_y')
+
+    def __init__(self, x: float, y: float, vx: float, vy: float):
+        super().__init__(x, y, vx, vy)
+        self.owner = None # The BarState that hit it last, it gets the power-ups the ball picks
+        # Where the ball gets to the bar it's going to, updated when its speed changes (bounces on the walls are folded)
+        self.arrival_side = 0
+        self.arrival_time = 0.0 # Match tick
+        self.arrival_y = TARGET_POINT
+
+class PowerUpState:
+    __slots__ = ('kind', 'x', 'y')
+
+    def __init__(self, kind: str, x: float, y: float):
+        self.kind = kind
+        self.x = x
+        self.y = y
+
+class ArenaMatch:
+    # balls: how many balls the match starts with, min_balls: a ball is served whenever there are less than these
+    # powerups False leaves them out, like for benchmarks that need a steady amount of balls
+    def __init__(self, seed = None, blue_ai: dict = None, red_ai: dict = None, balls: int = 1, min_balls: int = 1, powerups: bool = True):
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        blue_ai = blue_ai or DEFAULT_AI
+        red_ai = red_ai or DEFAULT_AI
+        self.blue_bar = BarState('blue', BLUE_BAR_X, BAR_START_Y, -1, blue_ai, self.rng.randint(*blue_ai['error']))
+        self.red_bar = BarState('red', RED_BAR_X, BAR_START_Y, 1, red_ai, self.rng.randint(*red_ai['error']))
+        self.balls = [] # Removed with a swap with the last one, so the order changes
+        self.powerups = []
+        self.min_balls = min_balls
+        self.powerups_enabled = powerups
+        self.time = 0
+        self.next_powerup = self.rng.randint(*POWERUP_INTERVAL)
+        self.hash = SpatialHash()
+
+        # What happened in the last step
+        self.wall_hits = 0
+        self.bar_hits = [] # (BarState, ArenaBall) of each hit
+        self.goals = [] # (BarState that scored, (x, y) of the ball)
+        self.pickups = [] # Picked PowerUpStates
+        self.checks = 0 # Narrow phase collision tests, bars, power-ups and ball pairs
+
+        for i in range(balls):
+            self.serve()
+
+    # Puts a new ball in the middle line, at a random height, going to a random side
+    def serve(self):
+        self.add_ball(BALL_START[0], self.rng.uniform(BALL_TOP_MIN, BALL_TOP_MAX), self.rng.choice(SERVE_SPEEDS), self.rng.uniform(*SERVE_VY))
+
+    def add_ball(self, x: float, y: float, vx: float, vy: float):
+        if len(self.balls) >= MAX_BALLS:
+            return None
+        ball = ArenaBall(x, y, vx, vy)
+        self.balls.append(ball)
+        self.__predict(ball)
+        return ball
+
+    # Runs one tick of the arena, the inputs work like in simulation.Match.step
+    def step(self, blue_input: int = None, red_input: int = None):
+        self.wall_hits = 0
+        self.bar_hits = []
+        self.goals = []
+        self.pickups = []
+        self.checks = 0
+        balls = self.balls
+        grid = self.hash
+
+        self.__move_bar(self.blue_bar, blue_input)
+        self.__move_bar(self.red_bar, red_input)
+
+        # Broad phase: every ball in the cell of its position, a bar looks for the balls that can get to it in this tick
+        grid.clear()
+        speed = 0
+        for i, ball in enumerate(balls):
+            grid.insert(i, ball.x, ball.y)
+            speed = max(speed, abs(ball.vx), abs(ball.vy))
+        reach = BALL_SIZE + speed
+        near_bars = {} # ball index: bars it may hit
+        for bar in (self.blue_bar, self.red_bar):
+            for i in grid.query(bar.x - reach, bar.y - reach, BAR_WIDTH + 2 * reach, BAR_HEIGHT + 2 * reach):
+                if balls[i].vx * bar.side > 0: # Only a ball going to the bar can hit it
+                    near_bars.setdefault(i, []).append(bar)
+
+        for i, ball in enumerate(balls):
+            bars = near_bars.get(i)
+            if bars is None and BALL_TOP_MIN <= ball.y + ball.vy <= BALL_TOP_MAX and BALL_TOP_MIN <= ball.y <= BALL_TOP_MAX:
+                ball.x += ball.vx # Nothing to touch in this tick, the same as a sweep with no contact
+                ball.y += ball.vy
+            else:
+                self.__sweep(ball, bars or ())
+
+        # Balls touching other balls and power-ups, with the new positions
+        grid.clear()
+        xs = [] # The rect positions, truncated like in the pygame rects
+        ys = []
+        for i, ball in enumerate(balls):
+            xs.append(int(ball.x))
+            ys.append(int(ball.y))
+            grid.insert(i, ball.x, ball.y)
+        pairs = grid.pairs()
+        self.checks += len(pairs)
+        for i, j in pairs:
+            if -BALL_SIZE < xs[j] - xs[i] < BALL_SIZE and -BALL_SIZE < ys[j] - ys[i] < BALL_SIZE: # overlaps() for same size rects
+                self.__bounce(balls[i], balls[j])
+        for powerup in list(self.powerups):
+            for i in grid.query(powerup.x - BALL_SIZE, powerup.y - BALL_SIZE, POWERUP_SIZE + BALL_SIZE, POWERUP_SIZE + BALL_SIZE):
+                ball = balls[i]
+                self.checks += 1
+                if overlaps(int(ball.x), int(ball.y), BALL_SIZE, BALL_SIZE, int(powerup.x), int(powerup.y), POWERUP_SIZE, POWERUP_SIZE):
+                    self.__pick(powerup, ball)
+                    break
+
+        # Checking for score
+        i = 0
+        while i < len(balls):
+            ball = balls[i]
+            left = int(ball.x)
+            if left < 1 or left + BALL_SIZE > FIELD_WIDTH - 1:
+                bar = self.red_bar if left < 1 else self.blue_bar
+                bar.score += 1
+                self.goals.append((bar, (left, int(ball.y))))
+                balls[i] = balls[-1]
+                balls.pop()
+            else:
+                i += 1
+        while len(balls) < self.min_balls:
+            self.serve()
+
+        if self.powerups_enabled:
+            self.next_powerup -= 1
+            if self.next_powerup <= 0:
+                self.next_powerup = self.rng.randint(*POWERUP_INTERVAL)
+                if len(self.powerups) < MAX_POWERUPS:
+                    self.powerups.append(PowerUpState(self.rng.choice(POWERUP_KINDS),
+                        self.rng.randint(POWERUP_AREA[0], POWERUP_AREA[1] - POWERUP_SIZE),
+                        self.rng.randint(BALL_TOP_MIN, FIELD_HEIGHT - 1 - POWERUP_SIZE)))
+
+        self.time += 1
+
+    # Same sweep as simulation.Match.sweep for a single ball, against the walls and the bars found by the broad phase
+    def __sweep(self, ball: ArenaBall, bars):
+        remaining = 1
+        for i in range(MAX_SWEEP_CONTACTS):
+            t = remaining
+            contact = None
+
+            wall_time = wall_contact_time(ball.y, ball.vy)
+            if wall_time is not None and wall_time < t:
+                t = max(wall_time, 0)
+                contact = WALL
+
+            for bar in bars:
+                if ball.vx * bar.side > 0:
+                    self.checks += 1
+                    bar_time = contact_time(ball.x, ball.y, ball.vx, ball.vy, bar.x, bar.y, BAR_WIDTH, BAR_HEIGHT)
+                    if bar_time is not None and bar_time < t:
+                        t = max(bar_time, 0)
+                        contact = bar
+
+            ball.x += ball.vx * t
+            ball.y += ball.vy * t
+            remaining -= t
+
+            if contact is None:
+                break
+            elif contact is WALL:
+                ball.vy = -ball.vy
+                self.wall_hits += 1
+            else:
+                self.__hit(contact, ball)
+
+    def __hit(self, bar: BarState, ball: ArenaBall):
+        ball.vx *= -1
+        delta_y = (int(ball.y) - BALL_SIZE / 2 - 32.5) - (int(bar.y) - BAR_HEIGHT / 2 - 12.5)
+        ball.vy += delta_y / 12
+
+        if ball.vx > 0:
+            ball.vx += int(ball.hit_count / 15) / 2
+        elif ball.vx < 0:
+            ball.vx -= int(ball.hit_count / 15) / 2
+
+        bar.error = self.rng.randint(*bar.ai['error'])
+        ball.hit_count += 1
+        ball.owner = bar
+        self.bar_hits.append((bar, ball))
+        self.__predict(ball)
+
+    # Overlapping equal balls: the speeds on the axis they touch on are swapped, if they're getting closer on it
+    def __bounce(self, a: ArenaBall, b: ArenaBall):
+        dx = b.x - a.x
+        dy = b.y - a.y
+        if BALL_SIZE - abs(dx) < BALL_SIZE - abs(dy): # Less overlap in x, they touch on the sides
+            if (b.vx - a.vx) * dx < 0:
+                a.vx, b.vx = b.vx, a.vx
+                self.__predict(a)
+                self.__predict(b)
+        elif (b.vy - a.vy) * dy < 0:
+            a.vy, b.vy = b.vy, a.vy
+            self.__predict(a)
+            self.__predict(b)
+
+    def __pick(self, powerup: PowerUpState, ball: ArenaBall):
+        self.powerups.remove(powerup)
+        self.pickups.append(powerup)
+        if powerup.kind == 'multiball':
+            for vy in MULTIBALL_VY:
+                new_ball = self.add_ball(ball.x, ball.y, ball.vx, ball.vy + vy)
+                if new_ball is not None:
+                    new_ball.owner = ball.owner
+        elif powerup.kind == 'fast':
+            ball.vx *= FAST_FACTOR
+        elif powerup.kind == 'slow':
+            ball.vx = max(abs(ball.vx) * SLOW_FACTOR, MIN_SPEED) * (1 if ball.vx > 0 else -1)
+        self.__predict(ball)
+
+    # Where the ball will get to the bar it's going to, with the AI strategy of that bar
+    def __predict(self, ball: ArenaBall):
+        bar = self.red_bar if ball.vx > 0 else self.blue_bar
+        contact_x = bar.contact_x()
+        ball.arrival_side = bar.side
+        ball.arrival_time = self.time + (contact_x - ball.x) / ball.vx
+        strategy = bar.ai.get('strategy', 'predict')
+        if strategy == 'center':
+            ball.arrival_y = TARGET_POINT
+        else:
+            arrival = predict_arrival(ball.x, ball.y, ball.vx, ball.vy, contact_x, strategy != 'straight')
+            ball.arrival_y = arrival if arrival is not None else TARGET_POINT
+
+    # Moves the bar a pixel to the arrival of the first ball coming to it, or to the wait point if none is coming
+    def __move_bar(self, bar: BarState, player_input: int):
+        if player_input is not None:
+            bar.y += player_input
+            return
+
+        first = None
+        side = bar.side
+        for ball in self.balls:
+            if ball.arrival_side == side and ball.arrival_time >= self.time and (first is None or ball.arrival_time < first.arrival_time):
+                first = ball
+        bar.target_point = first.arrival_y if first is not None else WAIT_POINT
+
+        center_y = int(bar.y) + BAR_HEIGHT // 2
+        if bar.target_point > center_y + bar.error:
+            bar.y += 1
+        elif bar.target_point < center_y + bar.error:
+            bar.y -= 1
@@ -0,0 +1,281 @@
+import hashlib, io, json, mmap, os, queue, struct, threading, time
+import pygame
+
+IMAGES = {} # Every decoded image, keyed by its file path
+DECODED = {} # Images decoded by a loading thread that weren't converted yet
+FONT_FILES = {} # Font files read by a loading thread, keyed by the file path
+ACTIONS = {} # Every parsed actions declaration, keyed by the asset folder
+
+# Where the assets come from: auto tries the bundle, then the atlas, then the loose files, or just one of them
+ASSET_MODE = os.environ.get('PONG_ASSETS', 'auto') # auto, bundle, atlas, loose
+
+ATLAS_MANIFEST = 'assets/atlas/manifest.json' # Written by atlas.py
+ATLAS = None # The loaded manifest folders, {} when there's no atlas
+
+# Bundle: a single file with the decoded pixels of every image, the actions and the fonts, written by bundle.py
+# Layout: header (magic, version, meta size), JSON meta, then the blobs, each at an offset given in the meta
+BUNDLE_PATH = 'assets/bundle.pack'
+BUNDLE_MAGIC = b'PBDL'
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('<4sHI')
+BUNDLE = None # The fresh parts of the mapped bundle, {} when there's no bundle
+SHEET_PATH = f'{BUNDLE_PATH}#sheet' # The name of the sprite sheet among the bundle images
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as source_file:
+        return hashlib.blake2b(source_file.read(), digest_size=16).hexdigest()
+
+# Whether a bundled source is still the same: a matching mtime and size is enough, otherwise (like after a checkout)
+# the content is hashed
+def source_fresh(path: str, stamp: list) -> bool:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != stamp[1]:
+        return False
+    return stat.st_mtime_ns == stamp[0] or file_hash(path) == stamp[2]
+
+# Maps the bundle and keeps just what was built from unchanged sources, the rest is loaded from the loose files
+def load_bundle(path: str = BUNDLE_PATH) -> dict:
+    global BUNDLE
+    if BUNDLE is not None:
+        return BUNDLE
+
+    BUNDLE = {}
+    if ASSET_MODE not in ('auto', 'bundle') or not os.path.isfile(path):
+        return BUNDLE
+    with open(path, 'rb') as bundle_file:
+        bundle_map = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, meta_size = BUNDLE_HEADER.unpack_from(bundle_map)
+    if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+        return BUNDLE
+    meta = json.loads(bundle_map[BUNDLE_HEADER.size:BUNDLE_HEADER.size + meta_size])
+
+    stale = {source for source, stamp in meta['sources'].items() if not source_fresh(source, stamp)}
+    BUNDLE = {
+        'map': bundle_map, # Kept open, the surfaces are made straight from its pages
+        'view': memoryview(bundle_map),
+        'images': {image: place for image, place in meta['images'].items() if image not in stale},
+        'fonts': {font: place for font, place in meta['fonts'].items() if font not in stale},
+        'actions': {folder: packed['actions'] for folder, packed in meta['actions'].items() if not stale.intersection(packed['sources'])},
+    }
+    return BUNDLE
+
+# Decodes an image without converting it, so it's safe to call from a loading thread
+def decode_image(path: str) -> pygame.Surface:
+    place = load_bundle().get('images', {}).get(path)
+    if place is not None: # Already decoded, the surface just wraps the bundle pixels
+        offset, width, height = place
+        return pygame.image.frombuffer(BUNDLE['view'][offset:offset + width * height * 4], (width, height), 'RGBA')
+    return pygame.image.load(path)
+
+# Loads an image just once, every other request for the same path gets the same surface
+def load_image(path: str, alpha: bool = True) -> pygame.Surface:
+    image = IMAGES.get(path)
+    if image is None:
+        image = DECODED.pop(path, None) or decode_image(path) # It may have been decoded by an AssetLoader thread already
+        image = image.convert_alpha() if alpha else image.convert() # Converts to the display pixel format to make blits cheap
+        IMAGES[path] = image
+    return image
+
+def load_font(path: str, size: int) -> pygame.font.Font:
+    place = load_bundle().get('fonts', {}).get(path)
+    if place is not None:
+        offset, length = place
+        return pygame.font.Font(io.BytesIO(BUNDLE['view'][offset:offset + length]), size)
+    if path in FONT_FILES:
+        return pygame.font.Font(io.BytesIO(FONT_FILES[path]), size)
+    return pygame.font.Font(path, size)
+
+# Whether a source file is the same the atlas was built from (atlas.source_stamp)
+def source_matches(path: str, stamp: list) -> bool:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return [stat.st_mtime_ns, stat.st_size] == stamp
+
+# The atlas folders whose sources didn't change since it was built: {folder: {'sheets': [sheet path], 'actions': packed actions}}
+def load_atlas(manifest_path: str = ATLAS_MANIFEST) -> dict:
+    global ATLAS
+    if ATLAS is not None:
+        return ATLAS
+
+    ATLAS = {}
+    if ASSET_MODE not in ('auto', 'atlas') or not os.path.isfile(manifest_path):
+        return ATLAS
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+    atlas_folder = os.path.dirname(manifest_path)
+    sheets = [f'{atlas_folder}/{name}' for name in manifest['sheets']]
+
+    for folder, packed in manifest['folders'].items():
+        if not all(source_matches(f'{folder}/{name}', stamp) for name, stamp in packed['sources'].items()):
+            continue # Stale, it's loaded from the PNGs
+        ATLAS[folder] = {'sheets': sheets, 'actions': packed['actions']}
+    return ATLAS
+
+# The actions.txt declarations of a folder: [(action name, mode, [frame times])]
+def read_actions(folder: str) -> list:
+    actions_file = open(f'{folder}/actions.txt', 'r') # Opens the file with the actions declarations
+    actions_decls = actions_file.read().splitlines() # Gets each declaration
+    actions_file.close() # Closes the file
+
+    actions = []
+    for action_decl in actions_decls: # Iterates for each declaration
+        action_decl = action_decl.split(' ') # Splits the string into each element
+        # The action name, its mode (loop or once) and how many ticks each frame is shown
+        actions.append((action_decl[0], action_decl[1], [int(times) for times in action_decl[2:]]))
+    return actions
+
+# Every image file load_actions needs for a folder
+def action_image_paths(folder: str) -> list:
+    if folder in load_bundle().get('actions', {}):
+        return [SHEET_PATH]
+    if folder in load_atlas():
+        return sorted({ATLAS[folder]['sheets'][frame[0]] for action in ATLAS[folder]['actions'].values() for frame in action['frames']})
+    return [f'{folder}/{action_name}/{action_name}_{i}.png' for action_name, mode, times in read_actions(folder) for i in range(len(times))]
+
+# Loads all the actions of an asset folder (assets/entities/<name> or assets/ui/<name>)
+# The returned dict is shared by every instance, so it must never be changed
+# Each action is [frames, mode], where frames has one (surface, area) pair for each tick the frame is shown
+# From the bundle or the atlas the surface is a sheet and area the frame rect in it, otherwise it's the frame image and area is None
+def load_actions(folder: str) -> dict:
+    actions = ACTIONS.get(folder)
+    if actions is not None:
+        return actions
+
+    actions = {}
+    packed = load_bundle().get('actions', {}).get(folder)
+    if packed is not None:
+        sheet = load_image(SHEET_PATH)
+        for action_name, action in packed.items():
+            frames = []
+            for x, y, width, height, times in action['frames']:
+                frames.extend([(sheet, pygame.Rect(x, y, width, height))] * times) # The rect is shared by every tick of the frame
+            actions[action_name] = [frames, action['mode']]
+    elif folder in load_atlas():
+        sheets = ATLAS[folder]['sheets']
+        for action_name, action in ATLAS[folder]['actions'].items():
+            frames = []
+            for sheet, x, y, width, height, times in action['frames']:
+                frames.extend([(load_image(sheets[sheet]), pygame.Rect(x, y, width, height))] * times)
+            actions[action_name] = [frames, action['mode']]
+    else:
+        for action_name, action_mode, action_times in read_actions(folder):
+            action_images = [] # A List to contain all images
+            for i in range(len(action_times)):
+                image = load_image(f'{folder}/{action_name}/{action_name}_{i}.png') # Decoded once, no matter how many times it's shown
+                action_images.extend([(image, None)] * action_times[i])
+            actions[action_name] = [action_images, action_mode]
+
+    ACTIONS[folder] = actions
+    return actions
+
+# Loads groups of assets (like the ones of a game screen) on demand, reading and decoding them in a worker thread
+# A group is {'images': [path], 'actions': [folder], 'fonts': [path]}. The thread only reads and decodes, the surfaces
+# are converted and cached by poll() in the main thread, which takes a fraction of a millisecond, so the main loop
+# never waits for the disk
+# A group that fails to load (like a missing file) is marked 'failed' and its exception is raised again by poll() or
+# wait() in the main thread, the thread goes on with the next groups
+class AssetLoader:
+    def __init__(self, groups: dict):
+        self.groups = groups
+        load_bundle() # The indexes are read here, so the thread just reads them
+        load_atlas()
+        self.__states = {} # group: 'queued', 'decoded', 'ready' or 'failed'
+        self.__errors = {} # group: the exception that made it fail
+        self.__done = {} # group: [files read, files to read], for the progress
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__work, name='asset-loader', daemon=True)
+        self.__thread.start()
+
+    # Queues the group if it isn't loaded or queued yet, the groups are loaded in the order they're requested
+    def request(self, group: str):
+        if group not in self.__states:
+            self.__states[group] = 'queued'
+            self.__done[group] = [0, 0]
+            self.__queue.put(group)
+
+    # The assets of the screens that are likely to come next are requested the same way, while the current one runs
+    prefetch = request
+
+    # Finishes the decoded groups, call it once a frame in the main thread, returns the groups that got ready
+    # Raises the exception of a group that failed
+    def poll(self) -> list:
+        ready = []
+        failed = None
+        for group, state in list(self.__states.items()):
+            if state == 'decoded':
+                self.__finish(group)
+                ready.append(group)
+            elif state == 'failed' and failed is None:
+                failed = group
+        if failed is not None:
+            raise self.__errors[failed]
+        return ready
+
+    def ready(self, group: str) -> bool:
+        return self.__states.get(group) == 'ready'
+
+    # Fraction of the group files read so far
+    def progress(self, group: str) -> float:
+        if self.ready(group):
+            return 1.0
+        done, total = self.__done.get(group, [0, 0])
+        return done / total if total else 0.0
+
+    # Loads the group and waits for it, up to timeout seconds if given, returns whether it's ready
+    # Just this group is finished, the others that get decoded in the meantime are still returned by the next poll
+    def wait(self, group: str, timeout: float = None) -> bool:
+        self.request(group)
+        end = None if timeout is None else time.perf_counter() + timeout
+        while not self.ready(group):
+            if self.__states[group] == 'failed':
+                raise self.__errors[group]
+            if self.__states[group] == 'decoded':
+                self.__finish(group)
+                break
+            if end is not None and time.perf_counter() > end:
+                return False
+            time.sleep(0.0005)
+        return True
+
+    # Converts the decoded images of the group in the main thread
+    def __finish(self, group: str):
+        for path in self.groups[group].get('images', []):
+            load_image(path)
+        for folder in self.groups[group].get('actions', []):
+            load_actions(folder)
+        self.__states[group] = 'ready'
+
+    def __work(self):
+        bundle = load_bundle()
+        while True:
+            group = self.__queue.get()
+            try:
+                self.__decode(group, bundle)
+            except Exception as error: # Raised in the main thread by poll() or wait()
+                self.__errors[group] = error
+                self.__states[group] = 'failed'
+
+    def __decode(self, group: str, bundle: dict):
+        assets = self.groups[group]
+        paths = list(assets.get('images', []))
+        for folder in assets.get('actions', []):
+            paths.extend(action_image_paths(folder))
+        fonts = [path for path in assets.get('fonts', []) if path not in bundle.get('fonts', {})]
+        done = self.__done[group]
+        done[1] = len(paths) + len(fonts)
+
+        for path in paths:
+            if path not in IMAGES and path not in DECODED:
+                DECODED[path] = decode_image(path)
+            done[0] += 1
+        for path in fonts:
+            if path not in FONT_FILES:
+                with open(path, 'rb') as font_file:
+                    FONT_FILES[path] = font_file.read()
+            done[0] += 1
+        self.__states[group] = 'decoded'
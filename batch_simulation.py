@@ -0,0 +1,319 @@
+import sys, time
+import numpy as np
+from simulation import Match, DEFAULT_AI, BALL_TOP_MIN, BALL_TOP_MAX, MAX_SWEEP_CONTACTS, SERVE_SPEEDS, BALL_START, BALL_SIZE, BAR_WIDTH, BAR_HEIGHT, BAR_START_Y, BLUE_BAR_X, RED_BAR_X, TARGET_POINT, WAIT_POINT
+
+# Runs many independent matches in lockstep with NumPy, following the same rules as simulation.Match
+# Each field is an array with one element per match, so a step advances every match with a few vectorized operations
+# Only AI bars are supported, the matches are meant for difficulty tuning sweeps
+# Every array is float64, the truncated positions (like int() in the scalar rules) are exact integers in it
+
+BALL_CENTER = BALL_SIZE // 2
+BAR_CENTER_X = BAR_WIDTH // 2
+BAR_CENTER_Y = BAR_HEIGHT // 2
+
+# np.sign as int8, made of two comparisons because they are cheaper than np.sign
+def _sign(values: np.ndarray) -> np.ndarray:
+    return (values > 0).view(np.int8) - (values < 0).view(np.int8)
+
+# simulation.predict_arrival for many balls at once, the balls that aren't going to target_x get NaN
+def predict_arrival(x: np.ndarray, y: np.ndarray, vx: np.ndarray, vy: np.ndarray, target_x) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (target_x - x) / vx
+    t[(vx == 0) | (t < 0)] = np.nan
+
+    gap = BALL_TOP_MAX - BALL_TOP_MIN
+    top = np.mod(y + vy * t - BALL_TOP_MIN, 2 * gap)
+    top = np.where(top > gap, 2 * gap - top, top)
+    return top + BALL_TOP_MIN + BALL_SIZE / 2
+
+# simulation.wall_contact_time for many balls, NaN where it's None
+def wall_contact_time(y: np.ndarray, vy: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(vy < 0, (BALL_TOP_MIN - y) / vy, np.where(vy > 0, (BALL_TOP_MAX - y) / vy, np.nan))
+
+# simulation.contact_time for many balls against a bar (bx and by can be arrays too), NaN where it's None
+# The times to both edges are the same divisions as the scalar ones, the smaller is the entry whatever the direction
+# Without movement in an axis they're -inf and inf when the rects overlap in it, the same inf (or NaN when the edges
+# touch) when they don't, which always ends as NaN, so that case needs no masks
+def contact_time(x: np.ndarray, y: np.ndarray, vx: np.ndarray, vy: np.ndarray, bx, by, bw: float, bh: float) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_near = (bx - (x + BALL_SIZE)) / vx
+        x_far = (bx + bw - x) / vx
+        y_near = (by - (y + BALL_SIZE)) / vy
+        y_far = (by + bh - y) / vy
+    x_entry = np.minimum(x_near, x_far)
+    x_exit = np.maximum(x_near, x_far)
+    y_entry = np.minimum(y_near, y_far)
+    y_exit = np.maximum(y_near, y_far)
+
+    entry = np.maximum(x_entry, y_entry)
+    entry[entry >= np.minimum(x_exit, y_exit)] = np.nan
+    return entry
+
+class BatchBar:
+    # ai is like simulation.DEFAULT_AI, but each value can also be an array with one value for each match
+    def __init__(self, n: int, x: int, side: int, ai: dict):
+        if ai.get('strategy', 'predict') != 'predict':
+            raise ValueError(f"the batch simulator only has the predict strategy, not {ai['strategy']}")
+        if 'policy' in ai:
+            raise ValueError(f"the batch simulator has no policy tables, not {ai['policy']}")
+        self.x = x
+        self.side = side
+        self.error_low = np.broadcast_to(np.asarray(ai['error'][0], dtype=np.int64), (n,))
+        self.error_high = np.broadcast_to(np.asarray(ai['error'][1], dtype=np.int64), (n,))
+        self.reaction = np.broadcast_to(np.asarray(ai['reaction'], dtype=np.float64), (n,))
+        self.y = np.full(n, BAR_START_Y, dtype=np.float64)
+        self.top = np.trunc(self.y) # The truncated y, the top of the bar rect
+        self.error = np.zeros(n, dtype=np.float64)
+        self.target_point = np.full(n, TARGET_POINT, dtype=np.float64)
+        self.score = np.zeros(n, dtype=np.int64)
+
+class BatchMatch:
+    def __init__(self, n: int, seed = None, blue_ai: dict = None, red_ai: dict = None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.__lane_rngs = None # When set, each match draws from its own random.Random, like simulation.Match
+
+        self.ball_x = np.full(n, BALL_START[0], dtype=np.float64)
+        self.ball_y = np.full(n, BALL_START[1], dtype=np.float64)
+        self.ball_vx = np.zeros(n, dtype=np.float64)
+        self.ball_vy = np.zeros(n, dtype=np.float64)
+        self.hit_count = np.zeros(n, dtype=np.int64)
+        self.ball_left = np.trunc(self.ball_x) # The truncated position, the top left of the ball rect
+        self.ball_top = np.trunc(self.ball_y)
+        self.hits = np.zeros(n, dtype=np.int64) # Every hit of the match, not just the ones in the current rally
+        self.blue_bar = BatchBar(n, BLUE_BAR_X, -1, blue_ai or DEFAULT_AI)
+        self.red_bar = BatchBar(n, RED_BAR_X, 1, red_ai or DEFAULT_AI)
+        self.time = 0
+
+        every = np.arange(n)
+        self.ball_vx[:] = self.__draw_serves(every)
+        self.blue_bar.error[:] = self.__draw_errors(every, self.blue_bar)
+        self.red_bar.error[:] = self.__draw_errors(every, self.red_bar)
+
+    # Builds a batch with the state of the given matches, drawing the random numbers from each match generator
+    # It's slower than a numpy generator, but makes every match of the batch follow its scalar match tick by tick
+    @classmethod
+    def from_matches(cls, matches: list):
+        blue_ai = {key: [match.blue_bar.ai[key] for match in matches] for key in ('reaction',)}
+        blue_ai['error'] = ([match.blue_bar.ai['error'][0] for match in matches], [match.blue_bar.ai['error'][1] for match in matches])
+        red_ai = {key: [match.red_bar.ai[key] for match in matches] for key in ('reaction',)}
+        red_ai['error'] = ([match.red_bar.ai['error'][0] for match in matches], [match.red_bar.ai['error'][1] for match in matches])
+
+        batch = cls(len(matches), 0, blue_ai, red_ai)
+        batch.__lane_rngs = [match.rng for match in matches]
+        batch.ball_x[:] = [match.ball.x for match in matches]
+        batch.ball_y[:] = [match.ball.y for match in matches]
+        batch.ball_vx[:] = [match.ball.vx for match in matches]
+        batch.ball_vy[:] = [match.ball.vy for match in matches]
+        batch.ball_left[:] = np.trunc(batch.ball_x)
+        batch.ball_top[:] = np.trunc(batch.ball_y)
+        batch.hit_count[:] = [match.ball.hit_count for match in matches]
+        for bar, name in ((batch.blue_bar, 'blue_bar'), (batch.red_bar, 'red_bar')):
+            states = [getattr(match, name) for match in matches]
+            bar.y[:] = [state.y for state in states]
+            bar.top[:] = np.trunc(bar.y)
+            bar.error[:] = [state.error for state in states]
+            bar.target_point[:] = [state.target_point for state in states]
+            bar.score[:] = [state.score for state in states]
+        batch.time = matches[0].time
+        return batch
+
+    def __draw_serves(self, lanes: np.ndarray) -> np.ndarray:
+        if self.__lane_rngs is not None:
+            return np.array([self.__lane_rngs[i].choice(SERVE_SPEEDS) for i in lanes], dtype=np.float64)
+        return np.where(self.rng.random(lanes.size) < 0.5, SERVE_SPEEDS[0], SERVE_SPEEDS[1])
+
+    def __draw_errors(self, lanes: np.ndarray, bar: BatchBar) -> np.ndarray:
+        if self.__lane_rngs is not None:
+            return np.array([self.__lane_rngs[i].randint(bar.error_low[i], bar.error_high[i]) for i in lanes], dtype=np.float64)
+        return self.rng.integers(bar.error_low[lanes], bar.error_high[lanes] + 1).astype(np.float64)
+
+    # Vectorized simulation.BarState.update_target_point for the matches in mask
+    def __update_target_point(self, bar: BatchBar, mask: np.ndarray):
+        lanes = np.flatnonzero(mask)
+        if lanes.size == 0:
+            return
+        contact_x = bar.x - BALL_SIZE if bar.side > 0 else bar.x + BAR_WIDTH
+        arrival = predict_arrival(self.ball_x[lanes], self.ball_y[lanes], self.ball_vx[lanes], self.ball_vy[lanes], contact_x)
+        coming = ~np.isnan(arrival)
+        bar.target_point[lanes[coming]] = arrival[coming]
+
+    def __move_bar(self, bar: BatchBar):
+        center_y = bar.top + BAR_CENTER_Y
+
+        # The movement of each AI branch, picked with masks instead of np.where (masked selects are much slower than int8 math)
+        wait = _sign(WAIT_POINT + bar.error - center_y) # The ball is going away
+        follow = _sign(self.ball_top + BALL_CENTER - center_y + bar.error) # Gets to where the ball is going
+        target = _sign(bar.target_point - (center_y + bar.error)) # The ball is close, so it goes to the predicted point
+        coming = self.ball_vx < 0 if bar.side < 0 else self.ball_vx > 0
+        near = np.abs(self.ball_left - bar.x) < bar.reaction # Same as the scalar delta_x, both centers have the same offset
+        near &= coming
+        movement = wait + coming.view(np.int8) * (follow - wait) + near.view(np.int8) * (target - follow)
+        bar.y += movement
+        np.trunc(bar.y, out=bar.top)
+
+    def __hit(self, bar: BatchBar, lanes: np.ndarray):
+        vx = -self.ball_vx[lanes]
+        self.ball_vy[lanes] += ((np.trunc(self.ball_y[lanes]) - BALL_SIZE / 2 - 32.5) - (bar.top[lanes] - BAR_HEIGHT / 2 - 12.5)) / 12
+        boost = (self.hit_count[lanes] // 15) / 2
+        self.ball_vx[lanes] = np.where(vx > 0, vx + boost, np.where(vx < 0, vx - boost, vx))
+        bar.error[lanes] = self.__draw_errors(lanes, bar)
+        self.hit_count[lanes] += 1
+        self.hits[lanes] += 1
+
+    # Vectorized simulation.Match.sweep, returns the side of the last bar hit by each ball (0 if none)
+    # Most balls can't touch anything in a tick, a cheap test with a pixel of margin finds the ones that may, and just these
+    # run the exact sweep, each one until it moves without a contact, like the scalar loop
+    def __sweep(self, duration: float) -> np.ndarray:
+        last_hit = np.zeros(self.n, dtype=np.int8)
+
+        reach_x = self.ball_x + self.ball_vx * duration
+        reach_y = self.ball_y + self.ball_vy * duration
+        maybe = (reach_y < BALL_TOP_MIN + 1) | (reach_y > BALL_TOP_MAX - 1)
+        maybe |= (self.ball_vx < 0) & (reach_x < self.blue_bar.x + BAR_WIDTH + 1)
+        maybe |= (self.ball_vx > 0) & (reach_x + BALL_SIZE > self.red_bar.x - 1)
+        lanes = np.flatnonzero(maybe)
+
+        # The free balls just move, the others are put back to be swept
+        x = self.ball_x[lanes]
+        y = self.ball_y[lanes]
+        self.ball_x[:] = reach_x
+        self.ball_y[:] = reach_y
+        self.ball_x[lanes] = x
+        self.ball_y[lanes] = y
+
+        remaining = np.full(lanes.size, duration, dtype=np.float64)
+        for i in range(MAX_SWEEP_CONTACTS):
+            if lanes.size == 0:
+                break
+            x = self.ball_x[lanes]
+            y = self.ball_y[lanes]
+            vx = self.ball_vx[lanes]
+            vy = self.ball_vy[lanes]
+            t = remaining.copy()
+            contact = np.zeros(lanes.size, dtype=np.int8) # 0 nothing, 2 a wall, -1 or 1 the side of the bar
+
+            wall_time = wall_contact_time(y, vy)
+            touch = wall_time < t
+            t[touch] = np.maximum(wall_time[touch], 0)
+            contact[touch] = 2
+
+            # Just the bar the ball goes to can be hit, so both are swept in one call
+            to_red = vx > 0
+            bar_x = np.where(to_red, self.red_bar.x, self.blue_bar.x)
+            bar_y = np.where(to_red, self.red_bar.y[lanes], self.blue_bar.y[lanes])
+            bar_time = contact_time(x, y, vx, vy, bar_x, bar_y, BAR_WIDTH, BAR_HEIGHT)
+            touch = (vx != 0) & (bar_time < t)
+            t[touch] = np.maximum(bar_time[touch], 0)
+            contact[touch] = np.where(to_red, self.red_bar.side, self.blue_bar.side)[touch]
+
+            self.ball_x[lanes] = x + vx * t
+            self.ball_y[lanes] = y + vy * t
+            remaining -= t
+
+            keep = contact != 0
+            lanes = lanes[keep]
+            remaining = remaining[keep]
+            contact = contact[keep]
+
+            wall = lanes[contact == 2]
+            self.ball_vy[wall] = -self.ball_vy[wall]
+            for bar in (self.blue_bar, self.red_bar):
+                hit = lanes[contact == bar.side]
+                if hit.size:
+                    self.__hit(bar, hit)
+                    last_hit[hit] = bar.side
+
+        return last_hit
+
+    # Runs one tick of every match
+    def step(self):
+        self.__move_bar(self.blue_bar)
+        self.__move_bar(self.red_bar)
+
+        last_hit = self.__sweep(1)
+        np.trunc(self.ball_x, out=self.ball_left)
+        np.trunc(self.ball_y, out=self.ball_top)
+
+        # Checking for score
+
+        red_goal = self.ball_left < 1
+        blue_goal = self.ball_left > 199 - BALL_SIZE
+        goal = red_goal | blue_goal
+        if goal.any():
+            lanes = np.flatnonzero(goal)
+            self.red_bar.score += red_goal
+            self.blue_bar.score += blue_goal
+            self.blue_bar.target_point[lanes] = TARGET_POINT
+            self.red_bar.target_point[lanes] = TARGET_POINT
+            self.ball_x[lanes] = self.ball_left[lanes] = BALL_START[0]
+            self.ball_y[lanes] = self.ball_top[lanes] = BALL_START[1]
+            self.ball_vx[lanes] = self.__draw_serves(lanes)
+            self.ball_vy[lanes] = 0
+            self.hit_count[lanes] = 0
+
+        # Updating the bar's AI target point
+
+        self.__update_target_point(self.red_bar, (last_hit == self.blue_bar.side) & ~goal)
+        self.__update_target_point(self.blue_bar, (last_hit == self.red_bar.side) & ~goal)
+
+        self.time += 1
+
+    def run(self, ticks: int):
+        for i in range(ticks):
+            self.step()
+
+# Simulates n matches of max_ticks ticks and returns the arrays of what happened in them
+def simulate_batch(seed: int, n: int, ai_params = None, max_ticks: int = 60 * 60 * 5) -> dict:
+    if ai_params is None or isinstance(ai_params, dict):
+        blue_ai = red_ai = ai_params
+    else:
+        blue_ai, red_ai = ai_params
+
+    batch = BatchMatch(n, seed, blue_ai, red_ai)
+    batch.run(max_ticks)
+    return {
+        'seed': seed,
+        'ticks': batch.time,
+        'blue_score': batch.blue_bar.score,
+        'red_score': batch.red_bar.score,
+        'hits': batch.hits,
+    }
+
+# Steps scalar matches and a batch made of them side by side, returning the first tick where any match differs (or None)
+def check_parity(seeds: list, ticks: int, ai_params = None):
+    if ai_params is None or isinstance(ai_params, dict):
+        blue_ai = red_ai = ai_params
+    else:
+        blue_ai, red_ai = ai_params
+
+    matches = [Match(seed, blue_ai, red_ai) for seed in seeds]
+    batch = BatchMatch.from_matches([Match(seed, blue_ai, red_ai) for seed in seeds])
+
+    for tick in range(ticks):
+        batch.step()
+        for i, match in enumerate(matches):
+            match.step()
+            scalar = (match.ball.x, match.ball.y, match.ball.vx, match.ball.vy, match.ball.hit_count,
+                match.blue_bar.y, match.red_bar.y, match.blue_bar.error, match.red_bar.error,
+                match.blue_bar.target_point, match.red_bar.target_point, match.blue_bar.score, match.red_bar.score)
+            vector = (batch.ball_x[i], batch.ball_y[i], batch.ball_vx[i], batch.ball_vy[i], batch.hit_count[i],
+                batch.blue_bar.y[i], batch.red_bar.y[i], batch.blue_bar.error[i], batch.red_bar.error[i],
+                batch.blue_bar.target_point[i], batch.red_bar.target_point[i], batch.blue_bar.score[i], batch.red_bar.score[i])
+            if scalar != vector:
+                return tick
+    return None
+
+# python batch_simulation.py [matches] [ticks]: checks the parity with the scalar engine and measures the throughput
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    diverged = check_parity(list(range(64)), 20000)
+    print('parity with simulation.Match: ' + ('ok' if diverged is None else f'diverged at tick {diverged}'))
+
+    start = time.perf_counter()
+    result = simulate_batch(1, n, max_ticks=ticks)
+    elapsed = time.perf_counter() - start
+    print(f'{n} matches x {ticks} ticks in {elapsed:.2f}s: {n * ticks / elapsed:,.0f} match-ticks per second')
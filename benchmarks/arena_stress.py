@@ -0,0 +1,44 @@
+# Stress test of the arena: ticks with hundreds of balls, timing each tick and counting the narrow phase collision
+# checks the spatial hash leaves, next to what testing every pair would take
+# Run from the repository root: python benchmarks/arena_stress.py
+import argparse, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arena import ArenaMatch
+
+TICK_BUDGET_MS = 1000 / 60
+
+def run(balls: int, ticks: int, seed: int) -> dict:
+    arena = ArenaMatch(seed, balls=balls, min_balls=balls, powerups=False) # Always the same amount of balls
+    for i in range(60): # Goes past the serve, when every ball is still in the middle line
+        arena.step()
+
+    tick_times = []
+    checks = 0
+    for i in range(ticks):
+        start = time.perf_counter()
+        arena.step()
+        tick_times.append(time.perf_counter() - start)
+        checks += arena.checks
+
+    tick_times.sort()
+    return {
+        'balls': balls,
+        'mean_ms': sum(tick_times) / ticks * 1000,
+        'p99_ms': tick_times[int(ticks * 0.99)] * 1000,
+        'checks': checks / ticks,
+        'all_pairs': balls * (balls - 1) / 2 + 2 * balls, # Every ball with every other ball and with both bars
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times arena ticks with many balls and counts the collision checks')
+    parser.add_argument('--balls', type=int, nargs='+', default=[50, 100, 200, 400, 800])
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"balls":>6} {"mean ms":>8} {"p99 ms":>8} {"checks/tick":>12} {"all pairs":>10} {"of budget":>10}')
+    for balls in args.balls:
+        result = run(balls, args.ticks, args.seed)
+        print(f'{result["balls"]:>6} {result["mean_ms"]:>8.3f} {result["p99_ms"]:>8.3f} {result["checks"]:>12.0f} {result["all_pairs"]:>10.0f} '
+            f'{result["mean_ms"] / TICK_BUDGET_MS * 100:>9.1f}%')
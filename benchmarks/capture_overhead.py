@@ -0,0 +1,58 @@
+# Cost of the gameplay capture for the game loop: frames like the game's are drawn into a 200x150 surface and captured,
+# timing just the capture call, for each format and drop policy, next to how many frames the writer kept up with
+# Run from the repository root: python benchmarks/capture_overhead.py
+import argparse, os, shutil, sys, tempfile, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+from capture import FrameCapture, FORMATS, DROP_POLICIES
+
+FRAME_TIME = 1 / 60
+
+def draw(surface: pygame.Surface, frame: int):
+    surface.fill((20, 20, 30))
+    for i in range(8): # A few moving things, so the PNG encoder has some work
+        pygame.draw.rect(surface, (200, 60 + i * 20, 60), ((frame * (i + 1)) % 200, (frame * 3 + i * 17) % 150, 6, 6))
+
+# paced: sleeps to 60 fps like the game, otherwise frames are captured as fast as they're drawn (the writer falls behind)
+def run(format: str, drop: str, frames: int, paced: bool, slots: int) -> dict:
+    surface = pygame.Surface((200, 150))
+    folder = tempfile.mkdtemp(prefix='capture-')
+    capture = FrameCapture(folder, surface.get_size(), format, slots, drop, surface)
+    times = []
+    start = time.perf_counter()
+    for frame in range(frames):
+        draw(surface, frame)
+        capture_start = time.perf_counter()
+        capture.capture(surface, frame)
+        times.append(time.perf_counter() - capture_start)
+        if paced:
+            time.sleep(max(0.0, start + (frame + 1) * FRAME_TIME - time.perf_counter()))
+    close_start = time.perf_counter()
+    counters = capture.close()
+    drain = time.perf_counter() - close_start
+    shutil.rmtree(folder)
+
+    times.sort()
+    return dict(counters, mean_us=sum(times) / frames * 1e6, p99_us=times[int(frames * 0.99)] * 1e6, drain_ms=drain * 1000)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the capture of each frame for every format and drop policy')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--slots', type=int, default=8)
+    parser.add_argument('--unpaced', action='store_true', help="doesn't wait for the next frame, to see the drops")
+    args = parser.parse_args()
+
+    pygame.init()
+    baseline = pygame.Surface((200, 150))
+    start = time.perf_counter()
+    for frame in range(args.frames):
+        draw(baseline, frame)
+    print(f'drawing a frame: {(time.perf_counter() - start) / args.frames * 1e6:.1f} us')
+
+    print(f'{"format":>6} {"drop":>7} {"mean us":>8} {"p99 us":>8} {"written":>8} {"dropped":>8} {"drain ms":>9}')
+    for format in FORMATS:
+        for drop in DROP_POLICIES:
+            result = run(format, drop, args.frames, not args.unpaced, args.slots)
+            print(f'{format:>6} {drop:>7} {result["mean_us"]:>8.1f} {result["p99_us"]:>8.1f} {result["written"]:>8} {result["dropped"]:>8} {result["drain_ms"]:>9.1f}')
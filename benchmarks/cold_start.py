@@ -0,0 +1,77 @@
+# Times the game from the process start to the first presented frame of the home screen with each asset source
+# The game loads just the home screen assets before it, eager loads every screen first (PONG_LAZY_ASSETS=0)
+# Run from the repository root after building the atlas and the bundle: python benchmarks/cold_start.py
+# With --drop-caches (root on Linux) the page cache is dropped before every run, for a start from disk
+import argparse, os, resource, subprocess, sys, time
+
+MODES = ('loose', 'atlas', 'bundle')
+BASELINE = 'import pygame; pygame.init(); pygame.display.set_mode((800, 600))' # Python, pygame and the window, no assets
+# Just the asset loading of the startup, in a new process, printed in ms
+ASSET_LOAD = BASELINE + """
+import time
+from assets import load_actions, load_image, load_font
+from atlas import find_folders
+start = time.perf_counter()
+for folder in find_folders():
+    load_actions(folder)
+load_image('assets/background/pitch.png')
+load_font('assets/ui/font/FreePixel.ttf', 15)
+print((time.perf_counter() - start) * 1000)
+"""
+
+# Returns the wall time and the CPU time of the run, the CPU time is much less noisy on a busy machine, and the output
+def run(command: list, env: dict, drop_caches: bool) -> tuple:
+    if drop_caches:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as caches:
+            caches.write('3')
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return wall, end_usage.ru_utime + end_usage.ru_stime - usage.ru_utime - usage.ru_stime, output
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the game startup to the first frame')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--drop-caches', action='store_true')
+    args = parser.parse_args()
+
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PONG_EXIT_AFTER_FIRST_FRAME='1', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    commands = {'baseline': ([sys.executable, '-c', BASELINE], {})}
+    commands.update({mode: ([sys.executable, 'main.py'], {'PONG_ASSETS': mode}) for mode in MODES})
+    commands.update({f'{mode}-eager': ([sys.executable, 'main.py'], {'PONG_ASSETS': mode, 'PONG_LAZY_ASSETS': '0'}) for mode in MODES})
+
+    results = {}
+    for i in range(args.runs): # Interleaved, so a slower moment of the machine hits every mode
+        for name, (command, extra_env) in commands.items():
+            results.setdefault(name, []).append(run(command, dict(env, **extra_env), args.drop_caches))
+
+    def median(values: list) -> float:
+        return sorted(values)[len(values) // 2]
+
+    baseline_wall = median([wall for wall, cpu, output in results['baseline']])
+    baseline_cpu = median([cpu for wall, cpu, output in results['baseline']])
+    for name, times in results.items():
+        wall = median([wall for wall, cpu, output in times])
+        cpu = median([cpu for wall, cpu, output in times])
+        extra = '' if name == 'baseline' else f' ({(wall - baseline_wall) * 1000:+6.1f} ms wall, {(cpu - baseline_cpu) * 1000:+6.1f} ms CPU over the baseline)'
+        print(f'{name:>12}: median {wall * 1000:6.1f} ms wall, {cpu * 1000:6.1f} ms CPU{extra}')
+
+    # What the game measures itself from pygame.init, without the interpreter and imports noise
+    # The startup ends when the frame loop starts, the first frame then waits for the frame rate clock
+    print('pygame.init to the frame loop:')
+    for name, times in results.items():
+        if name != 'baseline':
+            print(f'{name:>12}: median {median([float(output.split()[1]) for wall, cpu, output in times]):6.2f} ms')
+
+    print('asset loading alone:')
+    for mode in MODES:
+        times = []
+        for i in range(args.runs):
+            if args.drop_caches:
+                run(['true'], env, True)
+            output = subprocess.run([sys.executable, '-c', ASSET_LOAD], env=dict(env, PONG_ASSETS=mode), check=True, capture_output=True, text=True).stdout
+            times.append(float(output.split()[-1]))
+        print(f'{mode:>12}: median {median(times):6.2f} ms')
@@ -0,0 +1,48 @@
+# Compares the CPU cost of presenting a frame with the full and the dirty rects renderer modes
+# Run from the repository root: python benchmarks/render_present.py
+import os, sys, time
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from assets import load_actions
+from renderer import BackgroundLayers, Renderer
+
+FRAMES = 2000
+
+pygame.init()
+window = pygame.display.set_mode((800, 600))
+display = pygame.Surface((200, 150))
+
+backgrounds = BackgroundLayers([200, 150])
+backgrounds.add('play', (100,100,100), [('assets/background/pitch.png', (0,0))])
+ball_image, ball_area = load_actions('assets/entities/ball')['idle'][0][0]
+bar_image, bar_area = load_actions('assets/entities/blue_bar')['idle'][0][0]
+
+# Draws a rally like frame, the ball bouncing between the bars
+def draw_frame(renderer: Renderer, frame: int):
+    backgrounds.render(display, 'play')
+    renderer.blit(bar_image, [5, 63 + frame % 40], bar_area)
+    renderer.blit(bar_image, [190, 100 - frame % 40], bar_area)
+    renderer.blit(ball_image, [10 + (frame * 1.5) % 180, 10 + frame % 130], ball_area)
+
+def run(mode: str) -> tuple:
+    renderer = Renderer(window, display, mode)
+    present_time = 0
+    for frame in range(FRAMES):
+        draw_frame(renderer, frame)
+        start = time.perf_counter()
+        renderer.present()
+        present_time += time.perf_counter() - start
+    return present_time / FRAMES * 1000, window.copy()
+
+full_ms, full_window = run('full')
+dirty_ms, dirty_window = run('dirty')
+
+# Both modes must end with the same pixels in the window
+same = pygame.image.tobytes(full_window, 'RGB') == pygame.image.tobytes(dirty_window, 'RGB')
+
+print(f'full:  {full_ms:.4f} ms per frame')
+print(f'dirty: {dirty_ms:.4f} ms per frame')
+print(f'saved: {full_ms - dirty_ms:.4f} ms per frame ({(1 - dirty_ms / full_ms) * 100:.1f}%)')
+print(f'same window pixels: {same}')
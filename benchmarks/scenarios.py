@@ -0,0 +1,199 @@
+# Headless benchmark suite: runs the real game loop (main.run_frame) through scripted scenarios, a tick per frame and
+# without waiting for the frame rate, and reports how fast the logic and the render path go in each one, from the
+# frame profiler phases, next to the hot paths (font.render, entity render, transform.scale) timed on their own
+# The results are saved as JSON, and --compare tells which metrics got slower than in an older results file
+# Run from anywhere: python benchmarks/scenarios.py --output results.json [--compare old.json]
+import argparse, json, os, platform, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Scenarios run by default, each scripts the game through the events and the state a player or a match would give it
+SCENARIOS = ['home_idle', 'rally', 'goal_burst', 'pause_hover']
+LOGIC_PHASES = ['simulation', 'entities', 'scoring', 'ui']
+RENDER_PHASES = ['background', 'render', 'hud', 'scale', 'display']
+RESULTS_VERSION = 1
+THRESHOLD = 0.15 # Slowdown over which --compare reports a regression, runs on the same machine differ by up to about 10%
+
+# The game is imported with its whole setup, once, the scenarios share it like the screens of a session do
+def load_game(render_mode: str):
+    os.chdir(ROOT) # The assets are opened relative to the repository root
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ['PONG_LAZY_ASSETS'] = '0' # Loading isn't part of any scenario
+    os.environ['PONG_REPLAY'] = os.path.join(tempfile.mkdtemp(prefix='pong-bench-'), 'bench.replay') # The last session isn't overwritten
+    for name in ('PONG_CAPTURE', 'PONG_PROFILE_EXPORT', 'PONG_PROFILE_OVERLAY', 'PONG_EXIT_AFTER_FIRST_FRAME', 'PONG_DIFFICULTY'):
+        os.environ.pop(name, None)
+    import main
+    main.renderer.mode = render_mode
+    return main
+
+def mouse_event(game, kind: int, position: tuple, **attributes):
+    game.pygame.event.post(game.pygame.event.Event(kind, pos=position, **attributes))
+
+# Each scenario prepares the game and returns a function called before every frame with the frame number
+def home_idle(game):
+    game.MENU = 'home'
+    return lambda frame: None
+
+def rally(game):
+    from simulation import DIFFICULTIES, load_policy
+    game.play()
+    for bar in (game.match.blue_bar, game.match.red_bar): # Both bars return everything, so the rally goes on and the ball speeds up
+        bar.ai = DIFFICULTIES['expert']
+        bar.policy = load_policy(bar.ai['policy'])
+    return lambda frame: None
+
+def goal_burst(game):
+    game.play()
+    def before(frame: int):
+        if frame % 3 == 0: # A goal every third tick, more than the score particle pool holds
+            ball = game.match.ball
+            ball.x, ball.y, ball.vx = 0, 20 + frame % 100, -2
+    return before
+
+def pause_hover(game):
+    game.play()
+    game.run_frame(game.TICK_TIME)
+    game.MENU = 'pause'
+    # In window pixels: over resume, between the buttons, over home and out of both
+    positions = [(400, 200), (400, 320), (400, 396), (40, 40)]
+    def before(frame: int):
+        if frame % 4 == 0:
+            mouse_event(game, game.MOUSEMOTION, positions[frame // 4 % len(positions)], rel=(0, 0), buttons=(0, 0, 0))
+    return before
+
+def run_scenario(game, name: str, frames: int, warmup: int) -> dict:
+    from profiler import FrameProfiler
+    before = globals()[name](game)
+    for frame in range(warmup):
+        before(frame)
+        game.run_frame(game.TICK_TIME)
+
+    profiler = FrameProfiler(game.PROFILE_PHASES, window=frames) # Just the frames of the scenario
+    game.profiler = profiler
+    game.renderer.profiler = profiler
+    game.hud_text.reset_counters()
+    longest_rally = 0
+    goals = 0
+    start = time.perf_counter()
+    for frame in range(warmup, warmup + frames):
+        before(frame)
+        profiler.skip() # The scripting isn't timed
+        game.run_frame(game.TICK_TIME) # A tick each frame
+        longest_rally = max(longest_rally, game.match.ball.hit_count)
+        goals += game.match.goal is not None
+    seconds = time.perf_counter() - start
+
+    logic_ms = sum(profiler.mean(phase) for phase in LOGIC_PHASES)
+    render_ms = sum(profiler.mean(phase) for phase in RENDER_PHASES)
+    result = {
+        'frames': frames,
+        'ticks_per_second': 1000 / logic_ms if logic_ms else None,
+        'render_fps': 1000 / render_ms if render_ms else None,
+        'frame_fps': frames / seconds,
+        'frame_p99_ms': profiler.percentiles('frame', (0.99,))[0],
+        'phases_ms': {phase: profiler.mean(phase) for phase in profiler.phases if phase != 'sleep'},
+        # The HUD text renders served from the cache, they should be nearly all of them
+        'text_cache': {'hits': game.hud_text.hits, 'misses': game.hud_text.misses, 'hit_rate': game.hud_text.hit_rate()},
+    }
+    if name == 'rally':
+        result['longest_rally'] = longest_rally
+    if name == 'goal_burst':
+        result['goals'] = goals
+    return result
+
+def time_call(call, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+# The hot paths of the render on their own, in microseconds per call
+def hot_paths(game, repeat: int) -> dict:
+    pygame = game.pygame
+    scores = [str(score) for score in range(100)] # New text every call, like without the text cache
+    counter = [0]
+    def render_text():
+        counter[0] += 1
+        game.font.render(scores[counter[0] % 100], False, game.BLUE_TEXT)
+    scaled = pygame.Surface(game.WINDOW.get_size(), 0, game.WINDOW)
+    return {
+        'font_render_us': time_call(render_text, repeat),
+        'text_cache_us': time_call(lambda: game.hud_text.render('7', game.BLUE_TEXT), repeat),
+        'entity_render_us': time_call(lambda: game.entities.render(game.renderer, game.MATCH_ENTITIES, alpha=0.5), repeat) / len(game.MATCH_ENTITIES),
+        'transform_scale_us': time_call(lambda: pygame.transform.scale(game.DISPLAY, scaled.get_size(), scaled), repeat),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# The metrics of the new results that got slower than the old ones by more than threshold, as (name, old, new)
+def regressions(old: dict, new: dict, threshold: float = THRESHOLD) -> list:
+    found = []
+    for name, scenario in new['scenarios'].items():
+        old_scenario = old['scenarios'].get(name)
+        if old_scenario is None:
+            continue
+        for metric in ('ticks_per_second', 'render_fps', 'frame_fps'): # Higher is better
+            if old_scenario.get(metric) and scenario.get(metric) and scenario[metric] < old_scenario[metric] * (1 - threshold):
+                found.append((f'{name}.{metric}', old_scenario[metric], scenario[metric]))
+    for metric, us in new['hot_paths'].items(): # Lower is better
+        old_us = old['hot_paths'].get(metric)
+        if old_us and us > old_us * (1 + threshold):
+            found.append((metric, old_us, us))
+    return found
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the game headless through scripted scenarios and times its logic and render path')
+    parser.add_argument('--scenarios', nargs='+', default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument('--frames', type=int, default=1200)
+    parser.add_argument('--warmup', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=2000, help='calls of each hot path')
+    parser.add_argument('--render-mode', default='dirty', choices=['dirty', 'full'])
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='older results JSON file run with the same --render-mode, exits with 1 if a metric got slower by more than --threshold')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    game = load_game(args.render_mode)
+    results = {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pygame': game.pygame.version.ver,
+        'render_mode': args.render_mode,
+        'scenarios': {},
+    }
+
+    print(f'{"scenario":<12} {"ticks/s":>9} {"render fps":>10} {"frame fps":>9} {"p99 ms":>7} {"text hits":>9}')
+    for name in args.scenarios:
+        result = run_scenario(game, name, args.frames, args.warmup)
+        results['scenarios'][name] = result
+        print(f'{name:<12} {result["ticks_per_second"] or 0:>9.0f} {result["render_fps"] or 0:>10.0f} {result["frame_fps"]:>9.0f} {result["frame_p99_ms"]:>7.2f} '
+            + (f'{result["text_cache"]["hit_rate"] * 100:>8.1f}%' if result['text_cache']['hits'] + result['text_cache']['misses'] else f'{"-":>9}'))
+
+    results['hot_paths'] = hot_paths(game, args.repeat)
+    for metric, us in results['hot_paths'].items():
+        print(f'{metric:<20} {us:>8.1f} us')
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as old_file:
+            old = json.load(old_file)
+        old_mode = old.get('render_mode')
+        if old_mode != args.render_mode: # The full mode is slower by design, the difference isn't a regression
+            print(f'{args.compare} was run with --render-mode {old_mode}, not {args.render_mode}, run both with the same mode to compare them')
+            sys.exit(2)
+        found = regressions(old, results, args.threshold)
+        for metric, before, after in found:
+            print(f'regression: {metric} {before:.1f} -> {after:.1f}')
+        if found:
+            sys.exit(1)
+        print(f'no regression over {args.threshold * 100:.0f}% against {old.get("commit") or args.compare}')
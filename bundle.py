@@ -0,0 +1,114 @@
+import argparse, glob, json, os
+import pygame
+from assets import BUNDLE_PATH, BUNDLE_MAGIC, BUNDLE_VERSION, BUNDLE_HEADER, SHEET_PATH, file_hash, read_actions
+from atlas import find_folders, pack
+
+# Bundle build step: writes every asset the game loads at startup into a single file (assets/bundle.pack) that the game
+# maps with mmap, so there's no PNG to decode, no actions.txt to parse and a single file to open
+# Run it from the repository root after changing any asset: python bundle.py
+# The sprite frames are packed into one sheet (like atlas.py), the other images and the fonts are stored as they are used
+# Every source is stamped with its mtime, size and hash, so the game loads a changed one from the loose files
+
+IMAGE_PATTERNS = ('assets/background/*.png',) # Images loaded by path (load_image), besides the sprite frames
+FONT_PATTERNS = ('assets/ui/font/*.ttf',)
+SHEET_SIZE = 1024
+ALIGNMENT = 16 # Every blob starts at a multiple of it
+
+def source_stamp(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size, file_hash(path)]
+
+def build(path: str = BUNDLE_PATH) -> dict:
+    meta = {'sources': {}, 'images': {}, 'fonts': {}, 'actions': {}}
+    blobs = [] # (name, bytes), the offsets are set once the meta size is known
+
+    # Sprite frames, every frame image once in a single sheet
+    frames = {}
+    declarations = {}
+    for folder in find_folders():
+        declarations[folder] = read_actions(folder)
+        meta['sources'][f'{folder}/actions.txt'] = source_stamp(f'{folder}/actions.txt')
+        for action_name, mode, times in declarations[folder]:
+            for i in range(len(times)):
+                frame_path = f'{folder}/{action_name}/{action_name}_{i}.png'
+                frames[frame_path] = pygame.image.load(frame_path)
+                meta['sources'][frame_path] = source_stamp(frame_path)
+
+    places, sheet_sizes = pack({frame_path: image.get_size() for frame_path, image in frames.items()}, SHEET_SIZE)
+    if len(sheet_sizes) > 1:
+        raise ValueError(f'the sprite frames don\'t fit in a {SHEET_SIZE}x{SHEET_SIZE} sheet')
+    sheet = pygame.Surface(sheet_sizes[0], pygame.SRCALPHA, 32)
+    for frame_path, (sheet_index, x, y) in places.items():
+        sheet.blit(frames[frame_path], (x, y))
+    blobs.append((SHEET_PATH, sheet))
+
+    for folder, actions in declarations.items():
+        packed = {}
+        sources = [f'{folder}/actions.txt']
+        for action_name, mode, times in actions:
+            action_frames = []
+            for i in range(len(times)):
+                frame_path = f'{folder}/{action_name}/{action_name}_{i}.png'
+                sheet_index, x, y = places[frame_path]
+                width, height = frames[frame_path].get_size()
+                action_frames.append([x, y, width, height, times[i]])
+                sources.append(frame_path)
+            packed[action_name] = {'mode': mode, 'frames': action_frames}
+        meta['actions'][folder] = {'actions': packed, 'sources': sources}
+
+    # Other images and fonts
+    for pattern in IMAGE_PATTERNS:
+        for image_path in sorted(glob.glob(pattern)):
+            blobs.append((image_path, pygame.image.load(image_path)))
+            meta['sources'][image_path] = source_stamp(image_path)
+    for pattern in FONT_PATTERNS:
+        for font_path in sorted(glob.glob(pattern)):
+            with open(font_path, 'rb') as font_file:
+                blobs.append((font_path, font_file.read()))
+            meta['sources'][font_path] = source_stamp(font_path)
+
+    # The blob offsets depend on the meta size and the meta has the offsets, so the offsets are relative to the first blob
+    # until the meta size is known, then the meta is padded to it
+    data = []
+    offset = 0
+    for name, blob in blobs:
+        if isinstance(blob, pygame.Surface):
+            blob_data = pygame.image.tobytes(blob, 'RGBA')
+            meta['images'][name] = [offset, blob.get_width(), blob.get_height()]
+        else:
+            blob_data = blob
+            meta['fonts'][name] = [offset, len(blob)]
+        blob_data += bytes(-len(blob_data) % ALIGNMENT)
+        data.append(blob_data)
+        offset += len(blob_data)
+    blob_places = [place for places_of_kind in (meta['images'], meta['fonts']) for place in places_of_kind.values()]
+    relative = [place[0] for place in blob_places]
+
+    # Moving the offsets makes them longer, which can move the blobs again, so it's repeated until the meta fits
+    meta_size = len(json.dumps(meta).encode())
+    while True:
+        meta_size += -(BUNDLE_HEADER.size + meta_size) % ALIGNMENT
+        start = BUNDLE_HEADER.size + meta_size
+        for place, blob_offset in zip(blob_places, relative):
+            place[0] = start + blob_offset
+        meta_data = json.dumps(meta).encode()
+        if len(meta_data) <= meta_size:
+            break
+        meta_size = len(meta_data)
+    meta_data += b' ' * (meta_size - len(meta_data))
+
+    with open(path, 'wb') as bundle_file:
+        bundle_file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, meta_size))
+        bundle_file.write(meta_data)
+        for blob_data in data:
+            bundle_file.write(blob_data)
+    return meta
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes every startup asset into a single pre-decoded bundle')
+    parser.add_argument('--output', default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    meta = build(args.output)
+    print(f"{len(meta['sources'])} sources, {len(meta['images'])} images, {len(meta['actions'])} sprite folders and {len(meta['fonts'])} fonts "
+        f"in {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
@@ -0,0 +1,105 @@
+import collections, os, threading
+import pygame
+
+# Gameplay capture: each frame the low resolution surface (before it's scaled to the window) is copied into a slot of
+# a ring of preallocated surfaces, and a writer thread saves the queued slots to disk, so the game loop never waits
+# for the disk: a capture is a lock and a blit of 200x150 pixels
+# Formats:
+#   png: a frame_<number>.png file for each frame, the number is the frame of the game, so dropped frames are gaps
+#   raw: every frame appended to frames.rgb (rgb24), for an external encoder, and its frame number to frames.txt
+#       ffmpeg -f rawvideo -pix_fmt rgb24 -s 200x150 -r 60 -i frames.rgb highlights.mp4
+# When the writer falls behind and every slot is taken, a frame is dropped by the drop policy:
+#   newest: the frame being captured is dropped, the queued ones are kept (the capture has a gap at the end)
+#   oldest: the oldest queued frame is dropped to make room for the new one (the capture is always current)
+SLOTS = 8 # Frames that can wait for the writer, about 130 ms of game at 60 fps
+FORMATS = ('png', 'raw')
+DROP_POLICIES = ('newest', 'oldest')
+
+class FrameCapture:
+    def __init__(self, folder: str, size: tuple, format: str = 'png', slots: int = SLOTS, drop: str = 'newest', like: pygame.Surface = None):
+        if format not in FORMATS:
+            raise ValueError(f'unknown capture format {format}, not one of {", ".join(FORMATS)}')
+        if drop not in DROP_POLICIES:
+            raise ValueError(f'unknown drop policy {drop}, not one of {", ".join(DROP_POLICIES)}')
+        self.folder = folder
+        self.format = format
+        self.drop = drop
+        self.captured = 0 # Frames handed to capture
+        self.written = 0 # Frames saved by the writer
+        self.dropped = 0 # Frames lost because the writer was behind
+
+        os.makedirs(folder, exist_ok=True)
+        # Slots with the same pixel format as the captured surface, so copying a frame is a plain memory copy
+        self.__slots = [pygame.Surface(size, 0, like) if like is not None else pygame.Surface(size) for i in range(slots)]
+        self.__free = list(range(slots))
+        self.__queued = collections.deque() # (slot, frame number), oldest first
+        self.__lock = threading.Lock()
+        self.__wake = threading.Condition(self.__lock)
+        self.__closing = False
+
+        self.__raw = None
+        self.__raw_index = None
+        if format == 'raw':
+            self.__raw = open(f'{folder}/frames.rgb', 'wb')
+            self.__raw_index = open(f'{folder}/frames.txt', 'w')
+
+        self.__thread = threading.Thread(target=self.__work, name='frame-capture', daemon=True)
+        self.__thread.start()
+
+    # Copies the surface into a free slot and queues it, returns False if the frame was dropped
+    def capture(self, surface: pygame.Surface, frame: int = None) -> bool:
+        if frame is None:
+            frame = self.captured
+        self.captured += 1
+        with self.__lock:
+            if self.__free:
+                slot = self.__free.pop()
+            elif self.drop == 'oldest' and self.__queued:
+                slot = self.__queued.popleft()[0]
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return False
+        # Nobody else uses the slot until it's queued, so the copy is made without the lock
+        self.__slots[slot].blit(surface, (0, 0))
+        with self.__lock:
+            self.__queued.append((slot, frame))
+            self.__wake.notify()
+        return True
+
+    # Frames waiting for the writer
+    def pending(self) -> int:
+        with self.__lock:
+            return len(self.__queued)
+
+    # Writes the queued frames and stops the writer, returns the counters
+    def close(self) -> dict:
+        with self.__lock:
+            self.__closing = True
+            self.__wake.notify()
+        self.__thread.join()
+        if self.__raw is not None:
+            self.__raw.close()
+            self.__raw_index.close()
+            self.__raw = None
+        return {'captured': self.captured, 'written': self.written, 'dropped': self.dropped}
+
+    def __work(self):
+        while True:
+            with self.__lock:
+                while not self.__queued and not self.__closing:
+                    self.__wake.wait()
+                if not self.__queued: # Closing and nothing left
+                    return
+                slot, frame = self.__queued.popleft()
+            self.__write(self.__slots[slot], frame)
+            with self.__lock:
+                self.__free.append(slot)
+                self.written += 1
+
+    def __write(self, surface: pygame.Surface, frame: int):
+        if self.format == 'png':
+            pygame.image.save(surface, f'{self.folder}/frame_{frame:06d}.png')
+        else:
+            self.__raw.write(pygame.image.tobytes(surface, 'RGB'))
+            self.__raw_index.write(f'{frame}\n')
@@ -0,0 +1,71 @@
+import time
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, NOEVENT
+
+# Player input from the key events instead of the key state at the frame boundary
+# The frame clock pulls the events while it waits for the next frame, so each one gets the time it actually came in
+# (within about a millisecond) instead of the end of the wait, and a key pressed and released between two ticks still
+# moves the bar for a tick
+
+class EventClock:
+    def __init__(self):
+        self.__last = time.perf_counter()
+
+    # The next tick measures from now
+    def reset(self):
+        self.__last = time.perf_counter()
+
+    # Waits until 1/frame_rate seconds passed since the last tick (0 doesn't wait), pulling the events in the meantime
+    # Returns the ms since the last tick, like pygame.time.Clock.tick, and the events as (time pulled, event) pairs
+    def tick(self, frame_rate: int = 0) -> tuple:
+        events = []
+        if frame_rate:
+            deadline = self.__last + 1 / frame_rate
+            remaining = deadline - time.perf_counter()
+            while remaining > 0:
+                # The wait can come back a millisecond late, so the last one is spent polling (0 would wait forever)
+                event = pygame.event.wait(int(remaining * 1000) - 1) if remaining > 0.002 else pygame.event.poll()
+                if event.type != NOEVENT:
+                    events.append((time.perf_counter(), event))
+                remaining = deadline - time.perf_counter()
+        now = time.perf_counter()
+        events.extend((now, event) for event in pygame.event.get())
+        elapsed = now - self.__last
+        self.__last = now
+        return elapsed * 1000, events
+
+# The keys of a bar, fed with the key events
+class PaddleInput:
+    def __init__(self, up: int, down: int):
+        self.up = up
+        self.down = down
+        self.held = {up: False, down: False}
+        self.__pressed = {up: False, down: False} # Pressed since the last tick, even if already released
+        self.last_press = None # Time the last key was pressed, from time.perf_counter
+
+    # Handles a key event, returns True if it was one of the bar keys
+    def handle(self, event, timestamp: float) -> bool:
+        if event.type not in (KEYDOWN, KEYUP) or event.key not in self.held:
+            return False
+        if event.type == KEYDOWN:
+            self.held[event.key] = True
+            self.__pressed[event.key] = True
+            self.last_press = timestamp
+        else:
+            self.held[event.key] = False
+        return True
+
+    # Where the held keys move the bar: -1 up, 1 down, 0 stays
+    def direction(self) -> int:
+        return self.held[self.down] - self.held[self.up]
+
+    # The movement of the next tick, a key counts if it's held or was pressed since the last tick
+    def take(self) -> int:
+        movement = (self.held[self.down] or self.__pressed[self.down]) - (self.held[self.up] or self.__pressed[self.up])
+        self.__pressed[self.up] = self.__pressed[self.down] = False
+        return movement
+
+    # Forgets every key, like when the window loses focus and the releases never come
+    def reset(self):
+        for key in self.held:
+            self.held[key] = self.__pressed[key] = False
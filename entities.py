@@ -0,0 +1,212 @@
+import pygame
+from array import array
+from assets import load_actions
+
+# Every drawn thing of the game (ball, bars, particles, buttons) is an entity: an index into the component arrays
+# of an EntityStore. The store holds the position, size, rect and animation of all of them, and its systems go through
+# a list of entities in a single pass, changing the arrays and rects in place, so a tick makes no new objects
+# Entities are never removed, a dead one is just hidden and can be spawned again (see ParticlePool)
+
+# Every action of every asset folder gets an id, entities keep just the id
+ACTION_FRAMES = [] # id: list of (surface, area) frames, one reference for each tick it's shown
+ACTION_LOOPS = [] # id: True for loop actions, False for once actions
+ACTION_IDS = {} # asset folder: {action name: id}
+
+# Ids of the actions of an asset folder, the dict is shared by every entity of the folder
+def load_action_ids(folder: str) -> dict:
+    ids = ACTION_IDS.get(folder)
+    if ids is None:
+        ids = {}
+        for name, (frames, mode) in load_actions(folder).items():
+            ids[name] = len(ACTION_FRAMES)
+            ACTION_FRAMES.append(frames)
+            ACTION_LOOPS.append(mode == 'loop')
+        ACTION_IDS[folder] = ids
+    return ids
+
+class EntityStore:
+    def __init__(self, capacity: int = 64):
+        self.count = 0
+        self.capacity = 0
+
+        # Components
+        self.x = array('d')
+        self.y = array('d')
+        self.last_x = array('d') # Position in the last tick, used to interpolate the render
+        self.last_y = array('d')
+        self.vx = array('d') # Movement of the entities that aren't bound to a state
+        self.vy = array('d')
+        self.width = array('i')
+        self.height = array('i')
+        self.action = array('i')
+        self.frame = array('i')
+        self.default_action = array('i')
+        self.lives = array('i') # Times the action can end before the entity dies, -1 for never
+        self.visible = array('b')
+        self.rects = [] # pygame.Rect of each entity, changed in place
+        self.action_ids = [] # {action name: id} of each entity
+        self.states = [] # Object with x and y the entity follows (like a simulation BallState), or None
+
+        self.__grow(capacity)
+
+    # Returns the new entity
+    def add(self, folder: str, position: list, size: list, default_action: str = 'idle', state = None, visible: bool = True) -> int:
+        if self.count == self.capacity:
+            self.__grow(self.capacity * 2)
+        entity = self.count
+        self.count += 1
+
+        action_ids = load_action_ids(folder)
+        self.action_ids[entity] = action_ids
+        self.states[entity] = state
+        self.width[entity] = size[0]
+        self.height[entity] = size[1]
+        self.rects[entity].size = size
+        self.default_action[entity] = action_ids[default_action]
+        self.spawn(entity, position)
+        self.visible[entity] = visible
+        return entity
+
+    # Brings the entity back in its default action, lives is how many times the action can end before it dies
+    def spawn(self, entity: int, position: list, lives: int = -1):
+        self.action[entity] = self.default_action[entity]
+        self.frame[entity] = 0
+        self.lives[entity] = lives
+        self.visible[entity] = True
+        self.vx[entity] = 0
+        self.vy[entity] = 0
+        self.set_position(entity, position[0], position[1])
+
+    # Moves without interpolating from the old position
+    def set_position(self, entity: int, x: float, y: float):
+        self.x[entity] = self.last_x[entity] = x
+        self.y[entity] = self.last_y[entity] = y
+        self.rects[entity].topleft = (int(x), int(y))
+
+    # Reads the bound state and forgets the last position, call it after a teleport (so there's nothing to interpolate)
+    def save_position(self, entity: int):
+        state = self.states[entity]
+        if state is not None:
+            self.set_position(entity, state.x, state.y)
+        else:
+            self.set_position(entity, self.x[entity], self.y[entity])
+
+    # Keeps the current positions as the last ones, call it before each tick
+    def save_positions(self, entities: list, count: int = None):
+        x, y, last_x, last_y = self.x, self.y, self.last_x, self.last_y
+        for i in range(len(entities) if count is None else count):
+            entity = entities[i]
+            last_x[entity] = x[entity]
+            last_y[entity] = y[entity]
+
+    # Sets the action
+    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
+    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
+    def set_action(self, entity: int, action_name: str, force: bool = False):
+        action = self.action_ids[entity][action_name]
+        if ACTION_LOOPS[self.action[entity]]:
+            if self.action[entity] != action:
+                self.frame[entity] = 0
+                self.action[entity] = action
+            elif force:
+                self.frame[entity] = 0
+        elif force:
+            self.action[entity] = action
+            self.frame[entity] = 0
+
+    # Movement and animation system: moves the entities (following their states, if bound), updates their rects and
+    # goes to the next frame of their actions, all in one pass
+    def update(self, entities: list, count: int = None):
+        x, y, vx, vy, rects, states = self.x, self.y, self.vx, self.vy, self.rects, self.states
+        action, frame, lives, visible = self.action, self.frame, self.lives, self.visible
+        for i in range(len(entities) if count is None else count):
+            entity = entities[i]
+            if not visible[entity]:
+                continue
+
+            state = states[entity]
+            if state is not None:
+                x[entity] = state.x
+                y[entity] = state.y
+            else:
+                x[entity] += vx[entity]
+                y[entity] += vy[entity]
+            rect = rects[entity]
+            rect.x = int(x[entity])
+            rect.y = int(y[entity])
+
+            frame[entity] += 1
+            if frame[entity] >= len(ACTION_FRAMES[action[entity]]):
+                if not ACTION_LOOPS[action[entity]]: # If the action is a once play action, when it ends will auto set to the default action
+                    action[entity] = self.default_action[entity]
+                frame[entity] = 0
+                if lives[entity] > 0:
+                    lives[entity] -= 1
+                    if lives[entity] == 0:
+                        visible[entity] = False
+
+    # Draws the visible entities in order, between the last tick position and the current one
+    # alpha 0 is the last tick and 1 the current one
+    def render(self, camera, entities: list, count: int = None, alpha: float = 1):
+        x, y, last_x, last_y = self.x, self.y, self.last_x, self.last_y
+        for i in range(len(entities) if count is None else count):
+            entity = entities[i]
+            if self.visible[entity]:
+                position = (last_x[entity] + (x[entity] - last_x[entity]) * alpha, last_y[entity] + (y[entity] - last_y[entity]) * alpha)
+                surface, area = ACTION_FRAMES[self.action[entity]][self.frame[entity]]
+                camera.blit(surface, position, area)
+
+    def __grow(self, capacity: int):
+        extra = capacity - self.capacity
+        for component in (self.x, self.y, self.last_x, self.last_y, self.vx, self.vy):
+            component.extend([0.0] * extra)
+        for component in (self.width, self.height, self.action, self.frame, self.default_action, self.lives, self.visible):
+            component.extend([0] * extra)
+        self.rects.extend(pygame.Rect(0, 0, 0, 0) for i in range(extra))
+        self.action_ids.extend([None] * extra)
+        self.states.extend([None] * extra)
+        self.capacity = capacity
+
+# Keeps a fixed amount of preallocated particle entities and recycles the dead ones
+# The living particles are always the first ones of the list, so killing one is just a swap with the last living
+class ParticlePool:
+    # Every particle lives for lives plays of its default action
+    def __init__(self, store: EntityStore, folder: str, size: list, capacity: int, lives: int = 1):
+        self.__store = store
+        self.__particles = [store.add(folder, [0, 0], size, visible=False) for i in range(capacity)]
+        self.__lives = lives
+        self.alive = 0
+
+    def get_capacity(self) -> int:
+        return len(self.__particles)
+
+    # Brings a dead particle back to life, if every particle is alive the spawn is dropped and None is returned
+    def spawn(self, position: list):
+        if self.alive == len(self.__particles):
+            return None
+        particle = self.__particles[self.alive]
+        self.__store.spawn(particle, position, self.__lives)
+        self.alive += 1
+        return particle
+
+    def clear(self):
+        for i in range(self.alive):
+            self.__store.visible[self.__particles[i]] = False
+        self.alive = 0
+
+    def update(self):
+        self.__store.update(self.__particles, self.alive)
+        particles = self.__particles
+        visible = self.__store.visible
+        i = 0
+        while i < self.alive:
+            particle = particles[i]
+            if visible[particle]:
+                i += 1
+            else: # Swap-remove, the last living particle takes this slot and this one goes to the dead ones
+                self.alive -= 1
+                particles[i] = particles[self.alive]
+                particles[self.alive] = particle
+
+    def render(self, camera, alpha: float = 1):
+        self.__store.render(camera, self.__particles, self.alive, alpha)
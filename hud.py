@@ -0,0 +1,33 @@
+import pygame
+
+# Keeps the rendered surfaces of the HUD texts, so a text is only rasterized again when its value changes
+# hits and misses count how many renders were served from the cache and how many had to call font.render
+class TextCache:
+    def __init__(self, font: pygame.font.Font, max_size: int = 64):
+        self.__font = font
+        self.__max_size = max_size
+        self.__surfaces = {} # (text, color): surface, in insertion order so the oldest is dropped first
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text: str, color: tuple) -> pygame.Surface:
+        key = (text, color)
+        surface = self.__surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        if len(self.__surfaces) >= self.__max_size: # The timer makes a new text every second, so old ones are dropped
+            del self.__surfaces[next(iter(self.__surfaces))]
+        surface = self.__font.render(text, True, color)
+        self.__surfaces[key] = surface
+        return surface
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
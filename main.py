@@ -1,739 +1,521 @@
-import pygame, random
+import os, time
+import pygame
 from pygame.locals import *
+from assets import AssetLoader, load_font
+from ui import UiDispatcher
+from entities import EntityStore, ParticlePool
+from renderer import BackgroundLayers, Renderer
+from hud import TextCache
+from simulation import Match, DIFFICULTIES, BALL_SIZE, BAR_WIDTH, BAR_HEIGHT
+from arena import ArenaMatch, MAX_POWERUPS, POWERUP_SIZE
+from replay import ReplayRecorder, keep_previous
+from profiler import FrameProfiler, ProfilerOverlay, LatencyProbe
+from controls import EventClock, PaddleInput
+from capture import FrameCapture
 
 pygame.init()
+START_TIME = time.perf_counter()
 
-CLOCK = pygame.time.Clock()
+CLOCK = EventClock() # Pulls the events while it waits for the next frame, with the time each one came in
 
 WINDOW = pygame.display.set_mode((800,600))
 pygame.display.set_caption('Pong')
 
 DISPLAY = pygame.Surface((200, 150))
 
-MENU = 'home' # home, play, pause
-MATCH_TIME = 0
-
-class Ball:
-    def __init__(self, entity_name: str, position: list = [0,0], size: list = [0,0], default_action: str = 'idle'):
-        self.__actions = self.__load_actions(entity_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(int(self.__position[0]), int(self.__position[1]), self.__size[0], self.__size[1])
-        self.movement = [random.choice([-1.5, 1.5]), 0]
-        self.hit_count = 0
-
-    # Loads all the entity actions
-    def __load_actions(self, entity_name) -> dict :
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/entities/{entity_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/entities/{entity_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-
-    def get_rect(self) -> pygame.Rect:
-        return self.__rect
-
-    def set_position(self, position):
-        self.__position[0] = position[0]
-        self.__position[1] = position[1]
-        self.__update_rect()
-    
-    def __update_rect(self): # Updates the object rect x, y, width and height
-        self.__rect = pygame.Rect(int(self.__position[0]), int(self.__position[1]), self.__size[0], self.__size[1])
-
-    def apply_movement(self, movement): # Apply movement to the player
-        self.__position[0] += movement[0]
-        self.__position[1] += movement[1]
-        self.__update_rect()
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0 
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def reset(self):
-        self.score = 0
-        self.__position[0] = 98
-        self.__position[1] = 73
-        self.__update_rect()
-        self.movement = [random.choice([-1.5, 1.5]), 0]
-
-    def update(self):
-        self.next_frame()
-        self.apply_movement(self.movement)
-        if self.__rect.top < 1 or self.__rect.bottom > 149:
-            self.movement[1] *= -1
-            self.set_action('hit', True)
-
-class Bar:
-    def __init__(self, entity_name: str, position: list = [0,0], size: list = [0,0], player_control: dict = None, move_condition = None,  default_action: str = 'idle'):
-        self.__actions = self.__load_actions(entity_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(int(self.__position[0]), int(self.__position[1]), self.__size[0], self.__size[1])
-        self.__player_control = player_control
-        self.__move_condition = move_condition
-        self.__accuracy_error = random.randint(-8, 9)
-        self.target_point = 74
-        self.score = 0
-
-    # Loads all the entity actions
-    def __load_actions(self, entity_name) -> dict :
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/entities/{entity_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/entities/{entity_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-    
-    def __update_rect(self): # Updates the object rect x, y, width and height
-        self.__rect = pygame.Rect(int(self.__position[0]), int(self.__position[1]), self.__size[0], self.__size[1])
-
-    def apply_movement(self, movement): # Apply movement to the player
-        self.__position[0] += movement[0]
-        self.__position[1] += movement[1]
-        self.__update_rect()
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def get_rect(self):
-        return self.__rect
-
-    def set_control_mode(self, mode: dict, move_condition = None):
-        # mode = None: IA, dict: Player
-        # side = None: Player, 0: Right Side, 1: Left Side
-        self.__player_control = mode
-        self.__move_condition = move_condition
-    
-    def update_target_point(self, ball: Ball):
-        dx = self.__rect.centerx - ball.get_rect().centerx
-        dt = int(dx / ball.movement[0])
-
-        yi = ball.get_rect().centery
-
-        dy = ball.movement[1] * dt
-
-        yf = yi + dy
-
-        while yf < 0 or yf > 150:
-            if yf < 0:
-                yf *= -1
-            elif yf > 150:
-                yf = 300 - yf
-        
-        self.target_point = yf
-
-        return self.target_point
-
-    def reset(self):
-        self.score = 0
-        self.__rect.y = 63
-
-    def update(self, ball: Ball):
-        self.next_frame()
-
-        if self.__player_control: # Player control system
-            pressed_keys = pygame.key.get_pressed()
-            y_movement = (pressed_keys[self.__player_control['down']] - pressed_keys[self.__player_control['up']])
-            self.apply_movement([0, y_movement])
-        else: # IA control system
-            if self.__move_condition(ball.movement[0]):
-                delta_y = ball.get_rect().centery - self.__rect.centery + self.__accuracy_error # Gets to where the ball is going
-                delta_x = ball.get_rect().centerx - self.__rect.centerx
-            
-                if delta_x > -70 and delta_x < 70:
-                    if self.target_point > self.__rect.centery + self.__accuracy_error: 
-                        self.apply_movement([0, 1])
-                    elif self.target_point < self.__rect.centery + self.__accuracy_error:
-                        self.apply_movement([0, -1])
-                else:
-                    if delta_y > 0:
-                        self.apply_movement([0, 1])
-                    elif delta_y < 0: 
-                        self.apply_movement([0, -1])
-            else:
-                if self.__rect.centery > 75 + self.__accuracy_error:
-                    self.apply_movement([0, -1])
-                elif self.__rect.centery < 75 + self.__accuracy_error:
-                    self.apply_movement([0, 1])
-        
-        if self.__rect.colliderect(ball.get_rect()): # Gets wherever the ball collides with the bars
-            ball.movement[0] *= -1
-            ball_y = ball.get_rect().y - ( ball.get_rect().height / 2 ) - 32.5
-            self_y = self.__rect.y - ( self.__rect.height / 2 ) - 12.5
-            delta_y = ball_y - self_y
-            ball.movement[1] += delta_y / 12 # Sets the ball movement
-
-            if ball.movement[0] > 0:
-                ball.movement[0] += int( ball.hit_count / 15 ) / 2
-            elif ball.movement[0] < 0:
-                ball.movement[0] -= int( ball.hit_count / 15 ) / 2
-
-            self.__accuracy_error = random.randint(-8, 9)
-
-            self.set_action('hit', True) # Change the current bar action
-            ball.set_action('hit', True) # Change the ball action
-            ball.hit_count += 1 # Counter to increase the ball speed
-
-class ScoreParticle:
-    def __init__(self, entity_name: str, position: list = [0,0], size: list = [0,0], default_action: str = 'idle'):
-        self.__actions = self.__load_actions(entity_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(int(self.__position[0]), int(self.__position[1]), self.__size[0], self.__size[1])
-        self.is_living = 2
-
-    # Loads all the entity actions
-    def __load_actions(self, entity_name) -> dict :
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/entities/{entity_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/entities/{entity_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-            self.is_living -= 1
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def update(self):
-        self.next_frame()
-
-class ResumeButton:
-    def __init__(self, position: list, size: list, button_name, default_action = 'normal'):
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(position[0], position[1], size[0], size[1])
-        self.__actions = self.__load_actions(button_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-
-    # Loads all the entity actions
-    def __load_actions(self, button_name: str):
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/ui/{button_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/ui/{button_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def get_rect(self):
-        return self.__rect
-
-    def __on_click(self):
-        global MENU
-        MENU = 'play'
+TICK_RATE = 60 # Simulation steps per second, not a setting: every speed is in pixels per tick, so another rate changes how fast the game plays
+TICK_TIME = 1 / TICK_RATE
+FRAME_RATE = 60 # Rendered frames per second (like 144 or 30 to save power), 0 renders as fast as possible
+MAX_FRAME_TIME = 0.25 # Most real time simulated in a single frame, so a stall doesn't turn into a burst of ticks
 
-    def update(self):
-        self.next_frame()
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pos = (mouse_pos[0]/4, mouse_pos[1]/4)
-        hover = self.__rect.right >= mouse_pos[0] and mouse_pos[0] >= self.__rect.left and self.__rect.bottom >= mouse_pos[1] and mouse_pos[1] >= self.__rect.top
-        if hover:
-            self.set_action('hover')
-            if pygame.mouse.get_pressed(3)[0]:
-                self.__on_click()
-                self.set_action('click', True)
-
-class PlayButton:
-    def __init__(self, position: list, size: list, button_name, default_action = 'normal'):
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(position[0], position[1], size[0], size[1])
-        self.__actions = self.__load_actions(button_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-
-    # Loads all the entity actions
-    def __load_actions(self, button_name: str):
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/ui/{button_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/ui/{button_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def get_rect(self):
-        return self.__rect
-
-    def __on_click(self):
-        global MENU, red_bar, blue_bar, ball, MATCH_TIME
-        MENU = 'play'
-        red_bar.reset()
-        blue_bar.reset()
-        ball.reset()
-        MATCH_TIME = 0
-
-    def update(self):
-        self.next_frame()
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pos = (mouse_pos[0]/4, mouse_pos[1]/4)
-        hover = self.__rect.right >= mouse_pos[0] and mouse_pos[0] >= self.__rect.left and self.__rect.bottom >= mouse_pos[1] and mouse_pos[1] >= self.__rect.top
-        if hover:
-            self.set_action('hover')
-            if pygame.mouse.get_pressed(3)[0]:
-                self.__on_click()
-                self.set_action('click', True)
-
-class ExitButton:
-    def __init__(self, position: list, size: list, button_name, default_action = 'normal'):
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(position[0], position[1], size[0], size[1])
-        self.__actions = self.__load_actions(button_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-
-    # Loads all the entity actions
-    def __load_actions(self, button_name: str):
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/ui/{button_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/ui/{button_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def get_rect(self):
-        return self.__rect
-
-    def __on_click(self):
-        pygame.quit()
-        quit()
-
-    def update(self):
-        self.next_frame()
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pos = (mouse_pos[0]/4, mouse_pos[1]/4)
-        hover = self.__rect.right >= mouse_pos[0] and mouse_pos[0] >= self.__rect.left and self.__rect.bottom >= mouse_pos[1] and mouse_pos[1] >= self.__rect.top
-        if hover:
-            self.set_action('hover')
-            if pygame.mouse.get_pressed(3)[0]:
-                self.__on_click()
-                self.set_action('click', True)
-
-class HomeButton:
-    def __init__(self, position: list, size: list, button_name, default_action = 'normal'):
-        self.__position = position
-        self.__size = size
-        self.__rect = pygame.Rect(position[0], position[1], size[0], size[1])
-        self.__actions = self.__load_actions(button_name)
-        self.__action_frame = 0
-        self.__action_default = default_action
-        self.__action_current = default_action
-
-    # Loads all the entity actions
-    def __load_actions(self, button_name: str):
-        actions = {} # Create the entity actions dict
-        actions_file = open(f'assets/ui/{button_name}/actions.txt', 'r') # Opens the file with the actions declarations
-        actions_decls = actions_file.read().splitlines() # Gets each declaration
-        actions_file.close() # Closes the file
-
-        for action_decl in actions_decls: # Iterates for each declaration
-            action_decl = action_decl.split(' ') # Splits the string into each element
-            action_name = action_decl[0] # Gets the action name, it's the first element
-            action_mode = action_decl[1] # Gets the action mode loop or once
-            action_decl.remove(action_decl[0]) # Removes the action name to keep just the action frames times and the action mode
-            action_decl.remove(action_decl[0]) # Removes the action mode to keep just the action frames times
-            action_images = [] # A List to contain all images
-
-            for i in range(len(action_decl)):
-                for j in range(int(action_decl[i])):
-                    # Adding the image to the list of images
-                    action_images.append(pygame.image.load(f'assets/ui/{button_name}/{action_name}/{action_name}_{i}.png'))
-
-            actions[action_name] = [action_images, action_mode]
-        
-        return actions
-
-    # Sets the action
-    # If it's playing a loop action, this action can be interrupted to play another action and the frame count is restarted
-    # If it's playing a once play action, the action can be interrupted, but if you set force to True, so the action will be interrupted
-    def set_action(self, action_name, force: bool = False):
-        if self.__actions[self.__action_current][1] == 'loop':
-            if self.__action_current != action_name:
-                self.__action_frame = 0
-                self.__action_current = action_name
-            elif force:
-                self.__action_frame = 0
-        elif force:
-            self.__action_current = action_name
-            self.__action_frame = 0
-    
-    def next_frame(self): # Updates the current action
-        self.__action_frame += 1
-        if self.__action_frame > len(self.__actions[self.__action_current][0]) - 1:
-            if self.__actions[self.__action_current][1] == 'once': # If the action is a once play action, when it ends will auto set to the default action
-                self.set_action(self.__action_default, True)
-            self.__action_frame = 0
-    
-    def render(self, camera: pygame.Surface):
-        camera.blit(self.__actions[self.__action_current][0][self.__action_frame], self.__position)
-
-    def get_rect(self):
-        return self.__rect
-
-    def __on_click(self):
-        global MENU
-        MENU = 'home'
-        pygame.time.delay(250)
+RENDER_MODE = 'dirty' # dirty: updates just what changed, full: updates the whole window every frame
 
+MENU = 'home' # home, play, pause
+GAME_MODE = 'classic' # classic: a single ball, arena: many balls and power-ups (A on the home screen)
+ARENA_BALLS = int(os.environ.get('PONG_ARENA_BALLS', '1')) # Balls the arena starts with and never goes under
+PLAYER = os.environ.get('PONG_PLAYER') # blue or red plays that bar with the arrow keys, unset lets the AI play both
+DIFFICULTY = os.environ.get('PONG_DIFFICULTY') # easy, normal, hard or expert uses that policy table for the AI bars, unset is the classic AI
+
+REPLAY_PATH = os.environ.get('PONG_REPLAY', 'replays/last.replay') # Every session is recorded here, see replay.py to play it back
+
+EXIT_AFTER_FIRST_FRAME = os.environ.get('PONG_EXIT_AFTER_FIRST_FRAME') == '1' # Used to time the startup, see benchmarks/cold_start.py
+LAZY_ASSETS = os.environ.get('PONG_LAZY_ASSETS', '1') == '1' # 0 loads every screen before the first frame, like it used to
+
+# Frame phases timed by the profiler, in the order they run, F3 shows their percentiles
+PROFILE_PHASES = ['sleep', 'events', 'simulation', 'entities', 'scoring', 'ui', 'background', 'render', 'hud', 'capture', 'overlay', 'scale', 'display']
+PROFILE_EXPORT = os.environ.get('PONG_PROFILE_EXPORT') # A .csv or .jsonl file to write the timings of every frame to
+PROFILE_OVERLAY = os.environ.get('PONG_PROFILE_OVERLAY') == '1' # Starts with the overlay shown
+LATENCY_PROBE = os.environ.get('PONG_LATENCY') == '1' # Measures the time from a player key to the frame that shows the bar moving
+# The player bar is drawn where the last tick left it, interpolating it like the rest (see alpha) shows every move a tick later
+INTERPOLATE_PLAYER = os.environ.get('PONG_INTERPOLATE_PLAYER') == '1'
+
+# Gameplay capture of the low resolution frames, written on a background thread (see capture.py)
+CAPTURE_FOLDER = os.environ.get('PONG_CAPTURE') # A folder to write every frame to, unset doesn't capture
+CAPTURE_FORMAT = os.environ.get('PONG_CAPTURE_FORMAT', 'png') # png or raw
+CAPTURE_DROP = os.environ.get('PONG_CAPTURE_DROP', 'newest') # Which frame is dropped when the writer is behind: newest or oldest
+
+# The assets of each screen, loaded in the background when the screen (or the one before it) is shown
+ASSET_GROUPS = {
+    'home': {'images': ['assets/background/pitch.png'], 'actions': ['assets/ui/singleplayer', 'assets/ui/exit']},
+    'play': {
+        'actions': ['assets/entities/blue_bar', 'assets/entities/red_bar', 'assets/entities/ball', 'assets/entities/score', 'assets/entities/powerup'],
+        'fonts': ['assets/ui/font/FreePixel.ttf'],
+    },
+    'pause': {'actions': ['assets/ui/resume', 'assets/ui/home']},
+}
+SCREEN_GROUPS = {'home': ['home'], 'play': ['home', 'play'], 'pause': ['home', 'play', 'pause']} # Every group a screen draws
+NEXT_SCREENS = {'home': ['play'], 'play': ['pause'], 'pause': ['home']} # Prefetched while the screen runs
+
+STARTUP_WAIT = 0.1 # Seconds the first screen is waited for before the loop starts, so a fast disk shows no loading frame
+LOADING_COLOR = (100,100,100)
+LOADING_BAR_COLOR = (230,230,230)
+
+# A menu button, its entity has the normal, hover and click actions
+# It's a widget of a ui.UiDispatcher, which tells it where the mouse is, on_click runs when a press is released over it
+class Button:
+    def __init__(self, store: EntityStore, position: list, size: list, button_name: str, on_click, default_action: str = 'normal'):
+        self.__store = store
+        self.entity = store.add(f'assets/ui/{button_name}', position, size, default_action)
+        self.rect = store.rects[self.entity]
+        self.__on_click = on_click
+        self.hovered = False
+
+    def enter(self):
+        self.hovered = True
+
+    def leave(self):
+        self.hovered = False
+
+    def press(self):
+        self.__store.set_action(self.entity, 'click', True)
+
+    def release(self, inside: bool):
+        if inside:
+            self.__on_click()
+
+    # The hover action lasts a single tick, so it's kept while the mouse is over the button
     def update(self):
-        self.next_frame()
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pos = (mouse_pos[0]/4, mouse_pos[1]/4)
-        hover = self.__rect.right >= mouse_pos[0] and mouse_pos[0] >= self.__rect.left and self.__rect.bottom >= mouse_pos[1] and mouse_pos[1] >= self.__rect.top
-        if hover:
-            self.set_action('hover')
-            if pygame.mouse.get_pressed(3)[0]:
-                self.__on_click()
-                self.set_action('click', True)
-
-ball = Ball('ball', [98, 72], [5, 5])
-blue_bar = Bar('blue_bar', [5, 63], [5, 25], move_condition=lambda x: x < 0) #  player_control={'up': K_UP, 'down': K_DOWN}
-red_bar = Bar('red_bar', [190, 63], [5, 25], move_condition=lambda x: x > 0)
-
-score_particles = []
-
-resume_btn = ResumeButton([68, 35], [64, 32], 'resume')
-home_btn = HomeButton([68, 83], [64, 32], 'home')
-play_btn = PlayButton([68, 66], [64, 32], 'singleplayer')
-exit_btn = ExitButton([68, 114], [64, 32], 'exit')
-
-font = pygame.font.Font('assets/ui/font/FreePixel.ttf', 15)
-
-blue_score = font.render(str(blue_bar.score), True, pygame.Color(0,0,150))
-red_score = font.render(str(red_bar.score), True, pygame.Color(150,0,0))
-time_text = font.render(str(MATCH_TIME), True, pygame.Color(0,0,0))
-
-while True:
-    DISPLAY.fill((100,100,100))
-    DISPLAY.blit(pygame.image.load('assets/background/pitch.png'), (0,0))
+        if self.hovered:
+            self.__store.set_action(self.entity, 'hover')
+
+def resume():
+    global MENU
+    MENU = 'play'
+
+def play():
+    global MENU, GAME_MODE
+    if not screen_ready('play'): # The bars are made by setup_play, like the arena key the click waits for it
+        return
+    MENU = 'play'
+    GAME_MODE = 'classic'
+    recorder.reset()
+    reset_controls() # The keys pressed on the menus don't move the bars
+    bind_bars(match)
+    for entity in MATCH_ENTITIES:
+        entities.save_position(entity)
+
+def play_arena():
+    global MENU, GAME_MODE, arena
+    MENU = 'play'
+    GAME_MODE = 'arena'
+    arena = ArenaMatch(balls=ARENA_BALLS, min_balls=ARENA_BALLS)
+    reset_controls()
+    bind_bars(arena)
+    update_arena_entities()
+
+def exit_game():
+    recorder.close()
+    profiler.close()
+    if latency is not None:
+        print(latency.report())
+    if capture is not None:
+        counters = capture.close()
+        print(f"capture: {counters['written']} frames written to {CAPTURE_FOLDER}, {counters['dropped']} dropped")
+    pygame.quit()
+    quit()
+
+def home():
+    global MENU
+    MENU = 'home'
+
+# Forgets the held and pressed player keys
+def reset_controls():
+    for control in (blue_control, red_control):
+        if control is not None:
+            control.reset()
+
+# The movement for the next match step from the player keys, None lets the AI play
+def get_input(player_control: PaddleInput):
+    if player_control is not None:
+        return player_control.take()
+    return None
+
+match = Match(None, DIFFICULTIES.get(DIFFICULTY), DIFFICULTIES.get(DIFFICULTY))
+
+os.makedirs(os.path.dirname(REPLAY_PATH), exist_ok=True)
+keep_previous(REPLAY_PATH) # The session before keeps going as replays/last.1.replay
+recorder = ReplayRecorder(REPLAY_PATH, match) # Every change of the match goes through it
+
+entities = EntityStore()
+
+# The player keys of each bar, None lets the AI play it
+blue_control = PaddleInput(K_UP, K_DOWN) if PLAYER == 'blue' else None
+red_control = PaddleInput(K_UP, K_DOWN) if PLAYER == 'red' else None
+
+SCORE_PARTICLES_CAP = 8 # How many score particles can be alive at the same time
+
+BLUE_TEXT = (0,0,150)
+RED_TEXT = (150,0,0)
+TIME_TEXT = (0,0,0)
+
+profiler = FrameProfiler(PROFILE_PHASES, export_path=PROFILE_EXPORT)
+profiler_overlay = None # Made the first time it's shown
+latency = LatencyProbe() if LATENCY_PROBE and (blue_control or red_control) else None
+shown_bar_y = None # Where the player bar was drawn in the last frame, for the latency probe
+capture = FrameCapture(CAPTURE_FOLDER, DISPLAY.get_size(), CAPTURE_FORMAT, drop=CAPTURE_DROP, like=DISPLAY) if CAPTURE_FOLDER else None
+
+renderer = Renderer(WINDOW, DISPLAY, RENDER_MODE, profiler)
+shown_menu = None # The menu in the window, when it changes the whole window is drawn again
+
+backgrounds = BackgroundLayers([200, 150])
+
+# The mouse events of each menu go to its buttons
+UI_SCALE = (WINDOW.get_width() // DISPLAY.get_width(), WINDOW.get_height() // DISPLAY.get_height())
+UI = {'home': UiDispatcher(UI_SCALE), 'pause': UiDispatcher(UI_SCALE)}
+
+# Everything below is made by the setup of its asset group, once the group is loaded
+MATCH_ENTITIES = [] # In drawing order
+ARENA_ENTITIES = [] # The bars, the power-ups and the balls of the arena, in drawing order, made again every tick
+arena_balls = [] # Entities of the arena balls, the first ones are bound to arena.balls in order and the rest are hidden
+arena_powerups = []
+arena = None
+PAUSE_BUTTONS = []
+HOME_BUTTONS = []
+
+def setup_home():
+    global play_btn, exit_btn
+    backgrounds.add('play', (100,100,100), [('assets/background/pitch.png', (0,0))])
+    backgrounds.alias('pause', 'play')
+    backgrounds.alias('home', 'play')
+
+    play_btn = Button(entities, [68, 66], [64, 32], 'singleplayer', play)
+    exit_btn = Button(entities, [68, 114], [64, 32], 'exit', exit_game)
+    HOME_BUTTONS.extend([play_btn.entity, exit_btn.entity])
+    UI['home'].add(play_btn)
+    UI['home'].add(exit_btn)
+
+def setup_play():
+    global blue_bar, red_bar, ball, player_bar, score_particles, font, hud_text, blue_score, red_score, time_text
+    # The entities draw the match, the movement itself is in simulation.Match
+    blue_bar = entities.add('assets/entities/blue_bar', [match.blue_bar.x, match.blue_bar.y], [BAR_WIDTH, BAR_HEIGHT], state=match.blue_bar)
+    red_bar = entities.add('assets/entities/red_bar', [match.red_bar.x, match.red_bar.y], [BAR_WIDTH, BAR_HEIGHT], state=match.red_bar)
+    ball = entities.add('assets/entities/ball', [match.ball.x, match.ball.y], [BALL_SIZE, BALL_SIZE], state=match.ball)
+    MATCH_ENTITIES.extend([blue_bar, red_bar, ball])
+    player_bar = blue_bar if blue_control is not None else red_bar if red_control is not None else None
+    arena_powerups.extend(entities.add('assets/entities/powerup', [0, 0], [POWERUP_SIZE, POWERUP_SIZE], 'multiball', visible=False) for i in range(MAX_POWERUPS))
+
+    score_particles = ParticlePool(entities, 'assets/entities/score', [22, 22], SCORE_PARTICLES_CAP, lives=2)
+
+    font = load_font('assets/ui/font/FreePixel.ttf', 15)
+    hud_text = TextCache(font)
+    blue_score = hud_text.render(str(match.blue_bar.score), BLUE_TEXT)
+    red_score = hud_text.render(str(match.red_bar.score), RED_TEXT)
+    time_text = hud_text.render(str(match.time), TIME_TEXT)
+
+def setup_pause():
+    global resume_btn, home_btn
+    resume_btn = Button(entities, [68, 35], [64, 32], 'resume', resume)
+    home_btn = Button(entities, [68, 83], [64, 32], 'home', home)
+    PAUSE_BUTTONS.extend([resume_btn.entity, home_btn.entity])
+    UI['pause'].add(resume_btn)
+    UI['pause'].add(home_btn)
+
+SETUPS = {'home': setup_home, 'play': setup_play, 'pause': setup_pause}
+
+loader = AssetLoader(ASSET_GROUPS)
+if LAZY_ASSETS:
+    for group in SCREEN_GROUPS[MENU]:
+        if loader.wait(group, STARTUP_WAIT):
+            SETUPS[group]()
+else:
+    for group in ASSET_GROUPS:
+        loader.wait(group)
+        SETUPS[group]()
+
+# Whether every asset the screen draws is loaded, the missing ones are requested
+def screen_ready(screen: str) -> bool:
+    ready = True
+    for group in SCREEN_GROUPS[screen]:
+        if not loader.ready(group):
+            loader.request(group)
+            ready = False
+    return ready
+
+# Loading state, drawn instead of a screen while its assets are loaded, the frame loop never waits for them
+def render_loading(screen: str):
+    groups = SCREEN_GROUPS[screen]
+    progress = sum(loader.progress(group) for group in groups) / len(groups)
+    DISPLAY.fill(LOADING_COLOR)
+    pygame.draw.rect(DISPLAY, LOADING_BAR_COLOR, (50, 72, 100, 6), 1)
+    pygame.draw.rect(DISPLAY, LOADING_BAR_COLOR, (50, 72, int(100 * progress), 6))
+    renderer.invalidate() # Drawn straight into the surface
+
+def toggle_profiler_overlay():
+    global profiler_overlay
+    if profiler_overlay is None:
+        profiler_overlay = ProfilerOverlay(profiler, load_font('assets/ui/font/FreePixel.ttf', 8))
+    profiler_overlay.toggle()
+
+# The bar entities follow the bars of the match being played
+def bind_bars(played_match):
+    entities.states[blue_bar] = played_match.blue_bar
+    entities.states[red_bar] = played_match.red_bar
+    entities.save_position(blue_bar)
+    entities.save_position(red_bar)
+
+# Binds an entity to each ball and power-up of the arena, the balls change order when one is taken out, so an entity
+# that gets another ball isn't interpolated from where the old one was
+def update_arena_entities():
+    balls = arena.balls
+    while len(arena_balls) < len(balls):
+        arena_balls.append(entities.add('assets/entities/ball', [0, 0], [BALL_SIZE, BALL_SIZE], visible=False))
+    for i, arena_ball in enumerate(balls):
+        entity = arena_balls[i]
+        if entities.states[entity] is not arena_ball:
+            entities.states[entity] = arena_ball
+            entities.visible[entity] = True
+            entities.save_position(entity)
+    for entity in arena_balls[len(balls):]:
+        entities.states[entity] = None
+        entities.visible[entity] = False
+
+    for i, entity in enumerate(arena_powerups):
+        if i < len(arena.powerups):
+            powerup = arena.powerups[i]
+            entities.visible[entity] = True
+            entities.set_position(entity, powerup.x, powerup.y)
+            entities.set_action(entity, powerup.kind)
+        else:
+            entities.visible[entity] = False
+
+    ARENA_ENTITIES[:] = [blue_bar, red_bar] + arena_powerups + arena_balls[:len(balls)]
+
+# Runs one step of the arena
+def update_arena():
+    entities.save_positions(ARENA_ENTITIES)
+
+    arena.step(get_input(blue_control), get_input(red_control))
+    profiler.mark('simulation')
+
+    update_arena_entities()
+    entities.update(ARENA_ENTITIES)
+    for bar, arena_ball in arena.bar_hits:
+        entities.set_action(blue_bar if bar is arena.blue_bar else red_bar, 'hit', True)
+    profiler.mark('entities')
+
+    score_particles.update()
+    for bar, position in arena.goals:
+        score_particles.spawn([position[0]-11, position[1]-11])
+    for powerup in arena.pickups:
+        score_particles.spawn([powerup.x + POWERUP_SIZE // 2 - 11, powerup.y + POWERUP_SIZE // 2 - 11])
+    profiler.mark('scoring')
+
+# Runs one step of the match, every speed in the game is in pixels per tick
+def update_match():
+    if GAME_MODE == 'arena':
+        update_arena()
+        return
+
+    entities.save_positions(MATCH_ENTITIES)
+
+    recorder.step(get_input(blue_control), get_input(red_control))
+    profiler.mark('simulation')
+
+    entities.update(MATCH_ENTITIES)
+    if match.wall_hit or match.bar_hit is not None:
+        entities.set_action(ball, 'hit', True)
+    if match.bar_hit is match.blue_bar:
+        entities.set_action(blue_bar, 'hit', True)
+    elif match.bar_hit is match.red_bar:
+        entities.set_action(red_bar, 'hit', True)
+    profiler.mark('entities')
+
+    score_particles.update()
+
+    if match.goal is not None: # The ball was served again, so it must not be interpolated from where the goal happened
+        score_particles.spawn([match.goal_position[0]-11, match.goal_position[1]-11])
+        entities.save_position(ball)
+    profiler.mark('scoring')
+
+accumulator = 0 # Real time (in seconds) not simulated yet
+STARTUP_TIME = time.perf_counter() - START_TIME # From pygame.init to the loop, the first screen is loaded (unless the disk is slow)
+CLOCK.reset() # The startup isn't simulated as ticks
+profiler.skip() # Nor profiled
+
+if PROFILE_OVERLAY:
+    toggle_profiler_overlay()
+
+# Runs a single frame: events, the ticks that fit in the time since the last frame, drawing and presenting
+# elapsed: seconds of game to simulate instead of the real time, without waiting for the frame rate (see benchmarks/scenarios.py)
+def run_frame(elapsed: float = None):
+    global accumulator, MENU, shown_menu, blue_score, red_score, time_text, shown_bar_y
+    # The game is simulated in fixed steps, as many as fit in the real time that passed since the last frame
+    if elapsed is None:
+        frame_ms, events = CLOCK.tick(FRAME_RATE)
+        accumulator += min(frame_ms / 1000, MAX_FRAME_TIME)
+    else:
+        frame_ms, events = CLOCK.tick()
+        accumulator += elapsed
+    profiler.mark('sleep')
+
+    # ASSETS
+
+    for group in loader.poll():
+        SETUPS[group]()
 
     # EVENT HANDLER
 
-    for event in pygame.event.get():
+    for timestamp, event in events:
+        for control in (blue_control, red_control):
+            if control is not None:
+                moving = control.direction()
+                if control.handle(event, timestamp) and latency is not None and MENU == 'play':
+                    if moving == 0 and control.direction() != 0: # Starts moving, the next frames show it (even if it's a tap)
+                        latency.start(timestamp)
+
         if event.type == QUIT:
-            pygame.quit()
-            quit()
+            exit_game()
+        elif event.type == WINDOWFOCUSLOST: # The key releases go to another window
+            reset_controls()
+            if latency is not None:
+                latency.cancel()
+        elif event.type == VIDEOEXPOSE: # The window content was lost, so it must be drawn again
+            renderer.invalidate()
+        elif event.type in (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP):
+            if MENU in UI and screen_ready(MENU):
+                UI[MENU].handle(event)
         elif event.type == KEYDOWN:
-            if event.key == K_r and MENU == 'play':
-                ball.set_position([98, 72])
-                ball.movement = [random.choice([-1.5, 1.5]), 0]
-            elif event.key == K_ESCAPE:
+            if event.key == K_r and MENU == 'play' and MATCH_ENTITIES:
+                if GAME_MODE == 'arena': # One more ball
+                    arena.serve()
+                else:
+                    recorder.serve()
+                    entities.save_position(ball)
+            elif event.key == K_a and MENU == 'home' and screen_ready('play'):
+                play_arena()
+            elif event.key == K_F3:
+                toggle_profiler_overlay()
+            elif event.key == K_ESCAPE and screen_ready(MENU):
                 if MENU == 'play':
                     MENU = 'pause'
                 elif MENU == 'pause':
                     MENU = 'play'
-    
-    if MENU == 'play':
-        # LOGIC
-        ball.update()
-        blue_bar.update(ball)
-        red_bar.update(ball)
-
-        for p in score_particles:
-            p.update()
-
-        # Checking for score
-
-        if ball.get_rect().left < 1:
-            score_particles.append(ScoreParticle('score', [ball.get_rect().x-11, ball.get_rect().y-11], [22, 22]))
-            red_bar.score += 1
-            blue_bar.target_point = 74
-            red_bar.target_point = 74
-            ball.set_position([98, 72])
-            ball.movement = [random.choice([-1.5, 1.5]), 0]
-            ball.hit_count = 0
-
-        elif ball.get_rect().right > 199:
-            score_particles.append(ScoreParticle('score', [ball.get_rect().x-11, ball.get_rect().y-11], [22, 22]))
-            blue_bar.score += 1
-            blue_bar.target_point = 74
-            red_bar.target_point = 74
-            ball.set_position([98, 72])
-            ball.movement = [random.choice([-1.5, 1.5]), 0]
-            ball.hit_count = 0
-        
-        # Updating the bar's AI target point
-
-        if blue_bar.get_rect().colliderect(ball.get_rect()):
-            red_bar.update_target_point(ball)
-        if red_bar.get_rect().colliderect(ball.get_rect()):
-            blue_bar.update_target_point(ball)
-        
-        # Removing the particles
-
-        for p in score_particles:
-            if not p.is_living:
-                score_particles.remove(p)
-
-        # DRAWING
-
-        blue_bar.render(DISPLAY)
-        red_bar.render(DISPLAY)
-        ball.render(DISPLAY)
-
-        for p in score_particles:
-            p.render(DISPLAY)
-
-        blue_score = font.render(str(blue_bar.score), True, pygame.Color(0,0,150))
-        red_score = font.render(str(red_bar.score), True, pygame.Color(150,0,0))
-
-
-        match_seconds = int(MATCH_TIME // 60)
-        time_text = font.render(f'{match_seconds}s', True, pygame.Color(0,0,0))
-
-        DISPLAY.blit(blue_score, [98-blue_score.get_rect().width, 0])
-        DISPLAY.blit(red_score, [102, 0])
-        DISPLAY.blit(time_text, [100-time_text.get_rect().width/2, 150-time_text.get_rect().height])
-
-        MATCH_TIME += 1
 
-    elif MENU == 'pause':
-        resume_btn.update()
-        home_btn.update()
+    # LOGIC
+
+    loaded = screen_ready(MENU)
+    if loaded:
+        for screen in NEXT_SCREENS[MENU]:
+            for group in SCREEN_GROUPS[screen]:
+                loader.prefetch(group)
+    profiler.mark('events')
+
+    while accumulator >= TICK_TIME:
+        accumulator -= TICK_TIME
+
+        if not loaded: # Nothing runs until the screen can be drawn
+            continue
+        elif MENU == 'play':
+            update_match()
+        elif MENU == 'pause':
+            entities.update(PAUSE_BUTTONS)
+            resume_btn.update()
+            home_btn.update()
+            profiler.mark('ui')
+        elif MENU == 'home':
+            entities.update(HOME_BUTTONS)
+            play_btn.update()
+            exit_btn.update()
+            profiler.mark('ui')
+
+    # DRAWING
+
+    if not loaded:
+        render_loading(MENU)
+        shown_menu = None # The whole window is drawn again once the screen is loaded
+    else:
+        if MENU != shown_menu: # Every menu has its own background, so the whole window changes
+            renderer.invalidate()
+            shown_menu = MENU
+            for name, ui in UI.items(): # Just the shown menu has the mouse
+                ui.reset(pygame.mouse.get_pos() if name == MENU else None)
+        backgrounds.render(DISPLAY, MENU)
+    profiler.mark('background')
+
+    if not loaded:
+        pass # Just the loading state
+    elif MENU == 'play':
+        alpha = accumulator / TICK_TIME # How far the real time is between the last tick and the next one
+
+        shown_match = arena if GAME_MODE == 'arena' else match
+        drawn = ARENA_ENTITIES if GAME_MODE == 'arena' else MATCH_ENTITIES
+        if player_bar is None or INTERPOLATE_PLAYER:
+            entities.render(renderer, drawn, alpha=alpha)
+        else:
+            entities.render(renderer, [entity for entity in drawn if entity != player_bar], alpha=alpha)
+            entities.render(renderer, [player_bar])
+
+        score_particles.render(renderer)
+        profiler.mark('render')
+
+        blue_score = hud_text.render(str(shown_match.blue_bar.score), BLUE_TEXT)
+        red_score = hud_text.render(str(shown_match.red_bar.score), RED_TEXT)
+
+        match_seconds = shown_match.time // TICK_RATE
+        time_text = hud_text.render(f'{match_seconds}s', TIME_TEXT)
+
+        renderer.blit(blue_score, [98-blue_score.get_rect().width, 0])
+        renderer.blit(red_score, [102, 0])
+        renderer.blit(time_text, [100-time_text.get_rect().width/2, 150-time_text.get_rect().height])
+        profiler.mark('hud')
 
-        blue_bar.render(DISPLAY)
-        ball.render(DISPLAY)
-        red_bar.render(DISPLAY)
+    elif MENU == 'pause':
+        entities.render(renderer, ARENA_ENTITIES if GAME_MODE == 'arena' else MATCH_ENTITIES)
+        profiler.mark('render')
 
-        DISPLAY.blit(time_text, [100-time_text.get_rect().width/2, 150-time_text.get_rect().height])
-        DISPLAY.blit(blue_score, [98-blue_score.get_rect().width, 0])
-        DISPLAY.blit(red_score, [102, 0])
+        renderer.blit(time_text, [100-time_text.get_rect().width/2, 150-time_text.get_rect().height])
+        renderer.blit(blue_score, [98-blue_score.get_rect().width, 0])
+        renderer.blit(red_score, [102, 0])
+        profiler.mark('hud')
 
-        resume_btn.render(DISPLAY)
-        home_btn.render(DISPLAY)
+        entities.render(renderer, PAUSE_BUTTONS)
+        profiler.mark('render')
 
     elif MENU == 'home':
-        play_btn.update()
-        exit_btn.update()
-        
-        play_btn.render(DISPLAY)
-        exit_btn.render(DISPLAY)
-
-    WINDOW.blit(pygame.transform.scale(DISPLAY, (800,600)), (0,0))
-    pygame.display.update()
-    CLOCK.tick(60)
+        entities.render(renderer, HOME_BUTTONS)
+        profiler.mark('render')
+
+    if capture is not None: # Before the overlay, so it isn't recorded
+        capture.capture(DISPLAY)
+        profiler.mark('capture')
+
+    if profiler_overlay is not None:
+        profiler_overlay.render(renderer)
+        profiler.mark('overlay')
+
+    renderer.present()
+    if latency is not None and loaded and MENU == 'play': # The first frame that draws the bar somewhere else shows the input
+        bar_alpha = accumulator / TICK_TIME if INTERPOLATE_PLAYER else 1
+        bar_y = int(entities.last_y[player_bar] + (entities.y[player_bar] - entities.last_y[player_bar]) * bar_alpha)
+        latency.presented(time.perf_counter(), bar_y != shown_bar_y)
+        shown_bar_y = bar_y
+        profiler.skip()
+    profiler.end_frame()
+
+    if EXIT_AFTER_FIRST_FRAME and loaded: # The first frame of the screen, not of the loading state
+        print(f'startup {STARTUP_TIME * 1000:.2f} ms, first frame {(time.perf_counter() - START_TIME) * 1000:.2f} ms')
+        exit_game()
+
+if __name__ == '__main__':
+    while True:
+        run_frame()
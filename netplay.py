@@ -0,0 +1,336 @@
+import argparse, collections, heapq, random, socket, struct, time
+from replay import pack_state, unpack_state
+from simulation import Match
+
+# Online matches over UDP with rollback
+# Both peers run the same deterministic Match (same seed and AI) and exchange nothing but the input of their bar for each tick
+# A remote input that didn't arrive yet is predicted (the last one received is repeated). When the real one arrives and
+# it's different, the match is restored to the state before that tick and simulated again up to the present
+# Local inputs are applied input_delay ticks after they are read, which hides that much latency with no rollback at all
+#
+# Packet: magic, ack (next tick wanted from the peer), first tick of the inputs, how many inputs, one byte per input (input + 1)
+# A packet is sent for every simulated tick, with every input the peer didn't ack yet, so a lost packet costs nothing but a
+# later correction. Between ticks (polls and stalls) the inputs are sent again only if some aren't acked after
+# resend_interval seconds, so each loss or delay shows up in the session like it would on the network
+
+MAGIC = b'PNET'
+PACKET = struct.Struct('<4sIIB')
+MAX_PACKET_INPUTS = 64
+MAX_INPUT_DELAY = 8 # The input delay buffer never holds more ticks than these
+MAX_ROLLBACK = 12 # Most ticks simulated past the last confirmed remote input, the session waits for the peer after these
+TICK_RATE = 60
+RESEND_INTERVAL = 1 / TICK_RATE # Seconds with no ack before the inputs are sent again between ticks
+
+class UdpTransport:
+    # remote_address can be set later, when the peer port is known
+    def __init__(self, local_address: tuple = ('127.0.0.1', 0), remote_address: tuple = None):
+        self.remote_address = remote_address
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind(local_address)
+        self.__socket.setblocking(False)
+        self.address = self.__socket.getsockname()
+
+    def send(self, data: bytes):
+        try:
+            self.__socket.sendto(data, self.remote_address)
+        except (BlockingIOError, ConnectionRefusedError): # Works like a lost packet
+            pass
+
+    # Every packet waiting in the socket, from the peer only
+    def receive(self) -> list:
+        packets = []
+        while True:
+            try:
+                data, address = self.__socket.recvfrom(2048)
+            except BlockingIOError:
+                break
+            except ConnectionRefusedError: # The peer wasn't listening yet when a packet got there
+                continue
+            if address == self.remote_address:
+                packets.append(data)
+        return packets
+
+    def close(self):
+        self.__socket.close()
+
+# Wraps a transport to test the netcode on a single machine: the sent packets are held for latency +- jitter seconds
+# (so they may arrive out of order) and a loss fraction of them is dropped
+class LossyLink:
+    def __init__(self, transport, latency: float, jitter: float = 0, loss: float = 0, seed = None):
+        self.transport = transport
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.__rng = random.Random(seed)
+        self.__queue = [] # (send time, count, data) heap
+        self.__count = 0
+
+    def send(self, data: bytes):
+        if self.__rng.random() < self.loss:
+            return
+        delay = max(self.latency + self.__rng.uniform(-self.jitter, self.jitter), 0)
+        heapq.heappush(self.__queue, (time.perf_counter() + delay, self.__count, data))
+        self.__count += 1
+
+    def receive(self) -> list:
+        self.flush()
+        return self.transport.receive()
+
+    # Sends every held packet whose time came
+    def flush(self):
+        now = time.perf_counter()
+        while self.__queue and self.__queue[0][0] <= now:
+            self.transport.send(heapq.heappop(self.__queue)[2])
+
+class RollbackSession:
+    # side: the bar played here, 'blue' or 'red', the peer plays the other one
+    # transport: anything with send(data) and receive() -> list of packets (UdpTransport, LossyLink)
+    def __init__(self, match: Match, side: str, transport, input_delay: int = 2, max_rollback: int = MAX_ROLLBACK, resend_interval: float = RESEND_INTERVAL):
+        if side not in ('blue', 'red'):
+            raise ValueError(f'side must be blue or red, not {side!r}')
+        if not 0 <= input_delay <= MAX_INPUT_DELAY:
+            raise ValueError(f'input_delay must be between 0 and {MAX_INPUT_DELAY}')
+
+        self.match = match
+        self.side = side
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.resend_interval = resend_interval
+        self.tick = 0 # Next tick to simulate
+
+        self.__local_inputs = [0] * input_delay # By tick, the first ticks have no input yet
+        self.__queued_inputs = collections.deque() # Read while stalled, played on the next ticks
+        self.__remote_inputs = [] # Confirmed inputs of the peer by tick, with no gaps
+        self.__early_inputs = {} # tick: input of the peer that arrived after a missing one
+        self.__predicted = {} # tick: the guess used for a remote input that isn't confirmed
+        self.__states = {} # tick: state of the match before it, from the oldest tick that can be rolled back
+        self.__peer_ack = 0 # Next local tick the peer is waiting for
+        self.__rollback_tick = None # Oldest tick simulated with a wrong guess
+        self.__last_send = None # perf_counter of the last packet
+
+        # Stats
+        self.rollbacks = 0
+        self.rollback_ticks = 0 # Ticks simulated again
+        self.max_rollback_depth = 0
+        self.stalls = 0 # Calls to advance that had to wait for the peer
+        self.packets_sent = 0
+
+    # Ticks of the peer known for sure, the match is identical on both peers up to here
+    @property
+    def confirmed_tick(self) -> int:
+        return len(self.__remote_inputs)
+
+    # The inputs of this bar by tick and the ones of the peer confirmed so far, copies
+    @property
+    def local_inputs(self) -> list:
+        return list(self.__local_inputs)
+
+    @property
+    def remote_inputs(self) -> list:
+        return list(self.__remote_inputs)
+
+    # Reads the peer, rolls back if a guess was wrong and simulates the next tick
+    # local_input is the bar movement read now (-1 up, 0 stay, 1 down), it's played input_delay ticks later
+    # Returns False if the session is too far ahead of the peer and waited instead, the input is still played later
+    def advance(self, local_input: int) -> bool:
+        self.__receive()
+        self.__rollback()
+
+        queued = self.__queued_inputs
+        queued.append(local_input)
+        if self.tick - self.confirmed_tick >= self.max_rollback:
+            self.stalls += 1
+            self.__resend()
+            return False
+
+        if len(self.__local_inputs) == self.tick + self.input_delay:
+            self.__local_inputs.append(queued.popleft())
+        # The inputs read while stalled would add their ticks to the input delay for good, so a repeated input (a held
+        # key) is played one tick shorter instead, and a change of input is never lost
+        while len(queued) > 1 and queued[0] == queued[1]:
+            queued.popleft()
+        self.__simulate(self.tick)
+        self.tick += 1
+        self.__send()
+        return True
+
+    # Exchanges inputs and fixes the past without simulating a new tick
+    def poll(self):
+        self.__receive()
+        self.__rollback()
+        self.__resend()
+
+    def __receive(self):
+        remote_inputs = self.__remote_inputs
+        for packet in self.transport.receive():
+            if len(packet) < PACKET.size:
+                continue
+            magic, ack, first_tick, count = PACKET.unpack_from(packet)
+            if magic != MAGIC:
+                continue
+            self.__peer_ack = max(self.__peer_ack, ack)
+            for i, code in enumerate(packet[PACKET.size:PACKET.size + count]):
+                if first_tick + i >= len(remote_inputs):
+                    self.__early_inputs[first_tick + i] = code - 1
+
+        while len(remote_inputs) in self.__early_inputs:
+            tick = len(remote_inputs)
+            remote_input = self.__early_inputs.pop(tick)
+            remote_inputs.append(remote_input)
+            guess = self.__predicted.pop(tick, remote_input)
+            if guess != remote_input and (self.__rollback_tick is None or tick < self.__rollback_tick):
+                self.__rollback_tick = tick
+
+    def __rollback(self):
+        tick = self.__rollback_tick
+        if tick is not None:
+            self.__rollback_tick = None
+            unpack_state(self.match, self.__states[tick])
+            for past_tick in range(tick, self.tick):
+                self.__simulate(past_tick)
+            depth = self.tick - tick
+            self.rollbacks += 1
+            self.rollback_ticks += depth
+            self.max_rollback_depth = max(self.max_rollback_depth, depth)
+
+        # No tick before the confirmed ones can be rolled back anymore
+        oldest = min(self.confirmed_tick, self.tick)
+        for past_tick in [past_tick for past_tick in self.__states if past_tick < oldest]:
+            del self.__states[past_tick]
+
+    def __simulate(self, tick: int):
+        self.__states[tick] = pack_state(self.match)
+        if tick < len(self.__remote_inputs):
+            remote_input = self.__remote_inputs[tick]
+        else:
+            remote_input = self.__remote_inputs[-1] if self.__remote_inputs else 0
+            self.__predicted[tick] = remote_input
+
+        local_input = self.__local_inputs[tick]
+        if self.side == 'blue':
+            self.match.step(local_input, remote_input)
+        else:
+            self.match.step(remote_input, local_input)
+
+    def __send(self):
+        first_tick = self.__peer_ack
+        inputs = self.__local_inputs[first_tick:first_tick + MAX_PACKET_INPUTS]
+        self.transport.send(PACKET.pack(MAGIC, self.confirmed_tick, first_tick, len(inputs)) + bytes(code + 1 for code in inputs))
+        self.__last_send = time.perf_counter()
+        self.packets_sent += 1
+
+    # Sends again if the peer didn't ack every input in resend_interval, the packet also takes the ack of its inputs
+    def __resend(self):
+        if self.__last_send is None or time.perf_counter() - self.__last_send >= self.resend_interval:
+            if self.__peer_ack < len(self.__local_inputs):
+                self.__send()
+
+# Scripted player: holds a random direction for a random time, like a person pressing the keys
+class InputBot:
+    def __init__(self, seed):
+        self.__rng = random.Random(seed)
+        self.__input = 0
+        self.__hold = 0
+
+    def read(self) -> int:
+        if self.__hold == 0:
+            self.__input = self.__rng.choice((-1, 0, 1))
+            self.__hold = self.__rng.randint(5, 40)
+        self.__hold -= 1
+        return self.__input
+
+# The input sequence without its repeats, a held key becomes a single entry
+def input_changes(inputs: list) -> list:
+    return [code for i, code in enumerate(inputs) if i == 0 or code != inputs[i - 1]]
+
+# Plays a match between two sessions over localhost UDP, each with its own clock, through links with the given
+# round trip time (seconds), jitter and loss, then checks both peers ended in the same state, that every input got to
+# the peer and that the inputs read while stalled were played (no change of input is lost, a hold may be shorter)
+def run_loopback(seconds: float, rtt: float = 0.1, jitter: float = 0.01, loss: float = 0.05, input_delay: int = 2, seed: int = 0) -> dict:
+    transports = [UdpTransport(), UdpTransport()]
+    transports[0].remote_address = transports[1].address
+    transports[1].remote_address = transports[0].address
+    links = [LossyLink(transport, rtt / 2, jitter, loss, f'{seed}/link/{i}') for i, transport in enumerate(transports)]
+    sessions = [RollbackSession(Match(seed), side, link, input_delay) for side, link in zip(('blue', 'red'), links)]
+    bots = [InputBot(f'{seed}/{side}') for side in ('blue', 'red')]
+
+    ticks = int(seconds * TICK_RATE)
+    reads = [[], []] # Every input read by each bot
+    stalled_reads = 0
+    tick_times = []
+    start = time.perf_counter()
+    while min(session.tick for session in sessions) < ticks:
+        due = min(int((time.perf_counter() - start) * TICK_RATE) + 1, ticks)
+        for session, bot, session_reads in zip(sessions, bots, reads):
+            while session.tick < due:
+                local_input = bot.read()
+                session_reads.append(local_input)
+                tick_start = time.perf_counter()
+                advanced = session.advance(local_input)
+                tick_times.append(time.perf_counter() - tick_start)
+                if not advanced:
+                    stalled_reads += 1
+                    break
+            session.poll()
+        time.sleep(0.001)
+
+    # Every input gets to the other side, then both matches must be the same
+    while min(session.confirmed_tick for session in sessions) < ticks and time.perf_counter() - start < seconds + 5:
+        for session in sessions:
+            session.poll()
+        time.sleep(0.001)
+    for transport in transports:
+        transport.close()
+
+    delivered = True
+    played = True
+    for i, session in enumerate(sessions):
+        peer_inputs = sessions[1 - i].remote_inputs
+        delivered = delivered and peer_inputs == session.local_inputs[:len(peer_inputs)] and len(peer_inputs) >= ticks
+        played_changes = input_changes(session.local_inputs[input_delay:])
+        played = played and played_changes == input_changes(reads[i])[:len(played_changes)]
+
+    tick_times.sort()
+    simulated = sum(session.tick for session in sessions)
+    return {
+        'ticks': ticks,
+        'seconds': time.perf_counter() - start,
+        'input_delay_ms': input_delay * 1000 / TICK_RATE,
+        'rollbacks': sum(session.rollbacks for session in sessions),
+        'rollback_ticks': sum(session.rollback_ticks for session in sessions),
+        'mean_rollback_depth': sum(session.rollback_ticks for session in sessions) / max(sum(session.rollbacks for session in sessions), 1),
+        'max_rollback_depth': max(session.max_rollback_depth for session in sessions),
+        'stalls': sum(session.stalls for session in sessions),
+        'packets_per_tick': sum(session.packets_sent for session in sessions) / simulated,
+        'resimulated_per_tick': sum(session.rollback_ticks for session in sessions) / simulated,
+        'p99_advance_ms': tick_times[int(len(tick_times) * 0.99)] * 1000,
+        'in_sync': pack_state(sessions[0].match) == pack_state(sessions[1].match),
+        'inputs_delivered': delivered,
+        'stalled_inputs': stalled_reads,
+        'stalled_inputs_played': played,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays a bot match between two rollback sessions over localhost UDP with simulated latency, jitter and loss')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--rtt', type=float, default=100, help='round trip time in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='ms added or taken from each packet delay')
+    parser.add_argument('--loss', type=float, default=0.05, help='fraction of packets dropped')
+    parser.add_argument('--input-delay', type=int, default=2, help='ticks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sweep', action='store_true', help='runs every loss of 0, 5, 15 and 30%% with every jitter of 0, 10 and 40 ms at --rtt')
+    args = parser.parse_args()
+
+    if args.sweep:
+        print(f'{"loss":>5} {"jitter":>6} {"rollbacks":>9} {"depth":>6} {"max":>4} {"stalls":>6} {"resim/tick":>10} {"pkts/tick":>9} {"checks":>7}')
+        for loss in (0, 0.05, 0.15, 0.3):
+            for jitter in (0, 10, 40):
+                result = run_loopback(args.seconds, args.rtt / 1000, jitter / 1000, loss, args.input_delay, args.seed)
+                checks = result['in_sync'] and result['inputs_delivered'] and result['stalled_inputs_played']
+                print(f'{loss * 100:>4.0f}% {jitter:>4}ms {result["rollbacks"]:>9} {result["mean_rollback_depth"]:>6.2f} {result["max_rollback_depth"]:>4} '
+                    f'{result["stalls"]:>6} {result["resimulated_per_tick"]:>10.3f} {result["packets_per_tick"]:>9.2f} {"ok" if checks else "FAILED":>7}')
+    else:
+        result = run_loopback(args.seconds, args.rtt / 1000, args.jitter / 1000, args.loss, args.input_delay, args.seed)
+        for key, value in result.items():
+            print(f'{key:>22}: {value:.2f}' if isinstance(value, float) else f'{key:>22}: {value}')
@@ -0,0 +1,134 @@
+import argparse, os, struct, time
+from simulation import BALL_SIZE, BALL_TOP_MIN, BALL_TOP_MAX, FIELD_HEIGHT, WAIT_POINT, POLICY_FOLDER, POLICY_MAGIC, POLICY_VERSION, \
+    POLICY_HEADER, DIFFICULTIES, PolicyTable, Match, simulate
+
+# Policy table build step: writes a table for each difficulty level into assets/ai/<level>.policy
+# Run it from the repository root after changing a level: python policy.py
+# The game only looks the tables up (see simulation.PolicyTable), so a level can do any amount of work here
+#
+# Every table cell is a range of states, its target is the median of the targets of a few states spread over it,
+# so the far away cells (where a small change of vy moves the arrival a lot) get the most likely target
+
+T_EDGES = (2, 4, 6, 8, 11, 14, 18, 22, 27, 33, 40, 50, 62, 80, 100) # Ticks, closer buckets are smaller
+T_LAST = 130 # Ticks used for the last bucket, a ball at the other side at the slowest speed
+Y_STEP = 4
+Y_COUNT = -(-(BALL_TOP_MAX - BALL_TOP_MIN + 1) // Y_STEP)
+VY_STEP = 0.25
+VY_MAX = 4
+VY_COUNT = int(2 * VY_MAX / VY_STEP) + 1
+SAMPLES = 3 # States taken in each axis of a cell
+
+# reaction: ticks before the arrival the bar starts going to where the ball will get, before it it follows the ball
+# bounces: whether the prediction folds the bounces on the walls, or just limits the straight path to the pitch
+# anticipate: while the ball goes away, how much the bar leans from the wait point to where the ball will come back from
+# aim: pixels the bar moves from the arrival to hit the ball off center, sending it steeper to the far side
+LEVELS = {
+    'easy': {'reaction': 25, 'bounces': False, 'anticipate': 0.0, 'aim': 0},
+    'normal': {'reaction': 47, 'bounces': True, 'anticipate': 0.0, 'aim': 0},
+    'hard': {'reaction': 90, 'bounces': True, 'anticipate': 0.5, 'aim': 0},
+    'expert': {'reaction': T_LAST, 'bounces': True, 'anticipate': 0.6, 'aim': 7},
+}
+
+# Where the ball top is after t ticks
+def ball_top(y: float, vy: float, t: float, bounces: bool) -> float:
+    top = y + vy * t
+    if not bounces:
+        return min(max(top, BALL_TOP_MIN), BALL_TOP_MAX)
+    gap = BALL_TOP_MAX - BALL_TOP_MIN
+    top = (top - BALL_TOP_MIN) % (2 * gap)
+    if top > gap:
+        top = 2 * gap - top
+    return top + BALL_TOP_MIN
+
+# The target of the bar center for a single state
+def state_target(level: dict, coming: bool, t: float, y: float, vy: float) -> float:
+    if coming:
+        if t > level['reaction']: # Too far, it follows the ball
+            return y + BALL_SIZE / 2
+        arrival = ball_top(y, vy, t, level['bounces']) + BALL_SIZE / 2
+        if level['aim']:
+            arrival += -level['aim'] if arrival < FIELD_HEIGHT / 2 else level['aim'] # The ball hits the far end of the bar
+        return arrival
+    # The ball comes back from where it gets to the other bar, mirrored in y by the time it crosses the pitch again
+    comeback = ball_top(y, vy, t, True) + BALL_SIZE / 2
+    return WAIT_POINT + level['anticipate'] * (comeback - WAIT_POINT)
+
+# Range of values of a bucket, from its edges
+def bucket_range(edges: list, index: int, first: float, last: float) -> tuple:
+    low = edges[index - 1] if index > 0 else first
+    high = edges[index] if index < len(edges) else last
+    return low, high
+
+def spread(low: float, high: float) -> list:
+    return [low + (high - low) * (i + 0.5) / SAMPLES for i in range(SAMPLES)]
+
+def build_table(level: dict) -> bytes:
+    t_count = len(T_EDGES) + 1
+    targets = bytearray(2 * t_count * Y_COUNT * VY_COUNT)
+    index = 0
+    for coming in (False, True):
+        for t_index in range(t_count):
+            t_samples = spread(*bucket_range(T_EDGES, t_index, 0, T_LAST))
+            for y_index in range(Y_COUNT):
+                y_samples = spread(BALL_TOP_MIN + y_index * Y_STEP, BALL_TOP_MIN + (y_index + 1) * Y_STEP)
+                for vy_index in range(VY_COUNT):
+                    vy = -VY_MAX + vy_index * VY_STEP
+                    vy_samples = spread(vy - VY_STEP / 2, vy + VY_STEP / 2)
+                    samples = sorted(state_target(level, coming, t, y, vy) for t in t_samples for y in y_samples for vy in vy_samples)
+                    targets[index] = min(max(round(samples[len(samples) // 2]), 0), 255)
+                    index += 1
+    header = POLICY_HEADER.pack(POLICY_MAGIC, POLICY_VERSION, t_count, Y_STEP, Y_COUNT, VY_COUNT, VY_STEP, VY_MAX)
+    return header + struct.pack(f'<{len(T_EDGES)}f', *T_EDGES) + bytes(targets)
+
+def build(folder: str = POLICY_FOLDER, levels: dict = LEVELS) -> dict:
+    os.makedirs(folder, exist_ok=True)
+    sizes = {}
+    for name, level in levels.items():
+        data = build_table(level)
+        PolicyTable(data) # Checks it reads back
+        with open(f'{folder}/{name}.policy', 'wb') as policy_file:
+            policy_file.write(data)
+        sizes[name] = len(data)
+    return sizes
+
+# Time of an AI bar movement decision (Match.ai_movement), with the classic AI and with each table, in microseconds
+def time_decisions(ticks: int = 60 * 60) -> dict:
+    times = {}
+    for name, ai in [('classic', None)] + list(DIFFICULTIES.items()):
+        match = Match(0, ai, ai)
+        states = []
+        for i in range(ticks): # Real states of a match, every decision is timed on the same ones
+            match.step()
+            states.append((match.ball.x, match.ball.y, match.ball.vx, match.ball.vy, match.blue_bar.y))
+        bar = match.blue_bar
+        ball = match.ball
+        start = time.perf_counter()
+        ai_movement = match.ai_movement
+        for ball.x, ball.y, ball.vx, ball.vy, bar.y in states:
+            ai_movement(bar)
+        times[name] = (time.perf_counter() - start) / ticks * 1e6
+    return times
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the AI policy table of each difficulty level')
+    parser.add_argument('--folder', default=POLICY_FOLDER)
+    parser.add_argument('--matches', type=int, default=20, help='matches against the classic AI to rate each level, 0 skips it')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sizes = build(args.folder)
+    print(f'{len(sizes)} tables in {time.perf_counter() - start:.1f}s: ' + ', '.join(f'{name} {size / 1024:.1f} KB' for name, size in sizes.items()))
+
+    for name, us in time_decisions().items():
+        print(f'{name:>8}: {us:.2f} us per decision')
+
+    for name, ai in DIFFICULTIES.items(): # Against the classic AI, with the level on both sides
+        if args.matches:
+            points = [0, 0]
+            for i in range(args.matches):
+                blue_ai, red_ai = (ai, None) if i % 2 == 0 else (None, ai)
+                result = simulate(f'policy/{name}/{i}', (blue_ai, red_ai), max_score=11)
+                level_score, classic_score = (result['blue_score'], result['red_score']) if i % 2 == 0 else (result['red_score'], result['blue_score'])
+                points[0] += level_score
+                points[1] += classic_score
+            print(f'{name:>8}: {points[0]} - {points[1]} against the classic AI in {args.matches} matches')
@@ -0,0 +1,177 @@
+import json, os, time
+import pygame
+from array import array
+
+# Frame time profiler: the main loop marks the end of each of its phases and the time since the last mark is added
+# to that phase, so the phases of a frame add up to the whole frame (sleep included)
+# The last window frames are kept for the rolling percentiles, and every frame can be streamed to a .csv or .jsonl file
+# A mark is a perf_counter call and an addition, so measuring a whole frame costs about 10 microseconds (under 0.1% of
+# a 60 fps frame), the percentiles are only sorted when the overlay is refreshed
+
+WINDOW = 600 # Frames kept for the percentiles, 10 s at 60 fps
+QUANTILES = (0.5, 0.95, 0.99)
+
+class FrameProfiler:
+    def __init__(self, phases: list, window: int = WINDOW, export_path: str = None):
+        self.phases = list(phases)
+        self.window = window
+        self.frames = 0 # Frames ended so far
+        self.__index = {phase: i for i, phase in enumerate(self.phases)}
+        self.__current = [0.0] * len(self.phases) # Seconds of each phase in this frame
+        self.__history = [array('d', [0.0]) * window for phase in self.phases + ['frame']] # Ring buffers, in seconds
+        self.__last = time.perf_counter()
+
+        self.__export = None
+        self.__export_format = None
+        if export_path:
+            self.__export_format = 'jsonl' if export_path.endswith('.jsonl') else 'csv'
+            directory = os.path.dirname(export_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.__export = open(export_path, 'w')
+            if self.__export_format == 'csv':
+                self.__export.write(','.join(['frame'] + [f'{phase}_ms' for phase in self.phases] + ['total_ms']) + '\n')
+
+    # Adds the time since the last mark to the phase
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.__current[self.__index[phase]] += now - self.__last
+        self.__last = now
+
+    # Ignores the time since the last mark, like the time spent in the profiler itself
+    def skip(self):
+        self.__last = time.perf_counter()
+
+    def end_frame(self):
+        current = self.__current
+        slot = self.frames % self.window
+        for i, seconds in enumerate(current):
+            self.__history[i][slot] = seconds
+        total = sum(current)
+        self.__history[-1][slot] = total
+
+        if self.__export is not None:
+            if self.__export_format == 'csv':
+                self.__export.write(f'{self.frames},' + ','.join(f'{seconds * 1000:.4f}' for seconds in current) + f',{total * 1000:.4f}\n')
+            else:
+                timings = {phase: round(seconds * 1000, 4) for phase, seconds in zip(self.phases, current)}
+                self.__export.write(json.dumps({'frame': self.frames, 'ms': timings, 'total_ms': round(total * 1000, 4)}) + '\n')
+
+        for i in range(len(current)):
+            current[i] = 0.0
+        self.frames += 1
+
+    # Percentiles of a phase (or 'frame' for the whole frame) over the last window frames, in ms
+    def percentiles(self, phase: str, quantiles: tuple = QUANTILES) -> list:
+        history = self.__history[self.__index[phase] if phase != 'frame' else -1]
+        count = min(self.frames, self.window)
+        if count == 0:
+            return [0.0] * len(quantiles)
+        values = sorted(history[:count])
+        return [values[min(int(count * quantile), count - 1)] * 1000 for quantile in quantiles]
+
+    # Mean of a phase (or 'frame') over the last window frames, in ms
+    def mean(self, phase: str) -> float:
+        history = self.__history[self.__index[phase] if phase != 'frame' else -1]
+        count = min(self.frames, self.window)
+        return sum(history[:count]) / count * 1000 if count else 0.0
+
+    def close(self):
+        if self.__export is not None:
+            self.__export.close()
+            self.__export = None
+
+# Table of the phase percentiles drawn over the game, refreshed a few times a second so it's cheap to leave on
+class ProfilerOverlay:
+    def __init__(self, profiler: FrameProfiler, font: pygame.font.Font, refresh_frames: int = 30, color: tuple = (255,255,255), background: tuple = (0,0,0,170)):
+        self.profiler = profiler
+        self.visible = False
+        self.__font = font
+        self.__refresh_frames = refresh_frames
+        self.__color = color
+        self.__background = background
+        self.__surface = None
+        self.__refreshed = -refresh_frames
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.__surface = None
+
+    def render(self, camera, position: tuple = (1, 1)):
+        if not self.visible:
+            return
+        if self.__surface is None or self.profiler.frames - self.__refreshed >= self.__refresh_frames:
+            self.__refresh()
+        camera.blit(self.__surface, position)
+
+    def __refresh(self):
+        font = self.__font
+        lines = ['ms     ' + ''.join(f'{int(quantile * 100):>4}%' for quantile in QUANTILES)]
+        for phase in self.profiler.phases + ['frame']:
+            lines.append(f'{phase[:7]:<7}' + ''.join(f'{ms:5.1f}' for ms in self.profiler.percentiles(phase)))
+        rendered = [font.render(line, False, self.__color) for line in lines]
+        line_height = font.get_linesize()
+        self.__surface = pygame.Surface((max(line.get_width() for line in rendered) + 2, line_height * len(lines) + 2), pygame.SRCALPHA)
+        self.__surface.fill(self.__background)
+        for i, line in enumerate(rendered):
+            self.__surface.blit(line, (1, 1 + i * line_height))
+        self.__refreshed = self.profiler.frames
+
+# Input to display latency: from the time a key event came in to the end of the display update that first shows what it
+# did, kept as a histogram of bucket_ms wide buckets (the last one also has everything slower)
+# A single input is measured at a time, the ones that don't show in timeout seconds (like a bar already at the wall) are
+# counted as missed
+LATENCY_BUCKET_MS = 2
+LATENCY_BUCKETS = 25
+LATENCY_TIMEOUT = 0.25
+
+class LatencyProbe:
+    def __init__(self, bucket_ms: float = LATENCY_BUCKET_MS, buckets: int = LATENCY_BUCKETS, timeout: float = LATENCY_TIMEOUT):
+        self.bucket_ms = bucket_ms
+        self.timeout = timeout
+        self.counts = [0] * buckets
+        self.samples = array('d') # Every latency, in ms
+        self.missed = 0
+        self.pending = None # Time of the input being measured
+
+    def start(self, timestamp: float):
+        if self.pending is None:
+            self.pending = timestamp
+
+    # The input didn't show, and won't
+    def cancel(self):
+        if self.pending is not None:
+            self.pending = None
+            self.missed += 1
+
+    # Call it after every display update, ended at now (from time.perf_counter), with whether it shows the input
+    def presented(self, now: float, shown: bool):
+        if self.pending is None:
+            return
+        if not shown:
+            if now - self.pending > self.timeout:
+                self.cancel()
+            return
+        ms = (now - self.pending) * 1000
+        self.pending = None
+        self.samples.append(ms)
+        self.counts[min(int(ms / self.bucket_ms), len(self.counts) - 1)] += 1
+
+    def percentiles(self, quantiles: tuple = QUANTILES) -> list:
+        values = sorted(self.samples)
+        if not values:
+            return [0.0] * len(quantiles)
+        return [values[min(int(len(values) * quantile), len(values) - 1)] for quantile in quantiles]
+
+    # Text histogram, a line for each bucket from the first to the last with samples
+    def report(self, width: int = 40) -> str:
+        lines = [f'input latency: {len(self.samples)} inputs, {self.missed} missed, '
+            + ', '.join(f'p{int(quantile * 100)} {ms:.1f} ms' for quantile, ms in zip(QUANTILES, self.percentiles()))]
+        used = [i for i, count in enumerate(self.counts) if count]
+        if used:
+            most = max(self.counts)
+            for i in range(used[0], used[-1] + 1):
+                low = i * self.bucket_ms
+                label = f'{low:>5.0f}-{low + self.bucket_ms:<4.0f}ms' if i < len(self.counts) - 1 else f'{low:>5.0f}+    ms'
+                lines.append(f'{label} {"#" * round(self.counts[i] / most * width):<{width}} {self.counts[i]}')
+        return '\n'.join(lines)
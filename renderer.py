@@ -0,0 +1,85 @@
+import pygame
+from assets import load_image
+
+# Static layers are composited just once, so drawing one costs a single blit per frame
+class BackgroundLayers:
+    def __init__(self, size: list):
+        self.__size = size
+        self.__layers = {}
+
+    # Composites the layer from a fill color and a list of (image path, position) pairs drawn in order
+    def add(self, name: str, color: tuple, images: list = []):
+        layer = pygame.Surface(self.__size).convert()
+        layer.fill(color)
+        for path, position in images:
+            layer.blit(load_image(path), position)
+        self.__layers[name] = layer
+
+    # Makes another name show the same layer without compositing it again
+    def alias(self, name: str, layer_name: str):
+        self.__layers[name] = self.__layers[layer_name]
+
+    def get(self, name: str) -> pygame.Surface:
+        return self.__layers[name]
+
+    def render(self, camera: pygame.Surface, name: str):
+        camera.blit(self.__layers[name], (0, 0))
+
+# Draws the game into the low resolution surface and presents it scaled to the window
+# It's passed as the camera to the entities, so every blit goes through it and gets its rect recorded
+# Modes:
+#   full: scales the whole surface into the window and updates the whole window every frame
+#   dirty: scales and updates just the rects drawn in this frame and in the last one (to erase what moved)
+# Anything drawn straight into the surface (like the background) isn't tracked, call invalidate() when it changes
+# With a profiler.FrameProfiler, present marks the scale and display phases
+MAX_DIRTY_RECTS = 128 # With more rects than these (like in a crowded arena) scaling them one by one costs more than scaling it all
+
+class Renderer:
+    def __init__(self, window: pygame.Surface, surface: pygame.Surface, mode: str = 'dirty', profiler = None):
+        self.window = window
+        self.surface = surface
+        self.mode = mode
+        self.profiler = profiler
+        self.__scale = (window.get_width() // surface.get_width(), window.get_height() // surface.get_height())
+        self.__rects = [] # Rects drawn in this frame
+        self.__last_rects = [] # Rects drawn in the last frame
+        self.__full_redraw = True
+
+    def blit(self, source: pygame.Surface, dest, area = None, special_flags: int = 0) -> pygame.Rect:
+        rect = self.surface.blit(source, dest, area, special_flags)
+        if self.mode == 'dirty' and rect.width and rect.height:
+            self.__rects.append(rect)
+        return rect
+
+    # The next present will update the whole window
+    def invalidate(self):
+        self.__full_redraw = True
+
+    # Returns the window rects updated by the last present
+    def present(self) -> list:
+        if self.mode == 'full' or self.__full_redraw or len(self.__rects) + len(self.__last_rects) > MAX_DIRTY_RECTS:
+            pygame.transform.scale(self.surface, self.window.get_size(), self.window) # Scales straight into the window, no new surface
+            if self.profiler is not None:
+                self.profiler.mark('scale')
+            pygame.display.update()
+            updated = [self.window.get_rect()]
+            self.__full_redraw = False
+        else:
+            sx, sy = self.__scale
+            updated = []
+            for rects in (self.__last_rects, self.__rects):
+                for rect in rects:
+                    window_rect = pygame.Rect(rect.x * sx, rect.y * sy, rect.width * sx, rect.height * sy)
+                    pygame.transform.scale(self.surface.subsurface(rect), window_rect.size, self.window.subsurface(window_rect))
+                    updated.append(window_rect)
+            if self.profiler is not None:
+                self.profiler.mark('scale')
+            pygame.display.update(updated)
+
+        if self.profiler is not None:
+            self.profiler.mark('display')
+
+        # The rects of this frame become the last ones and the old list is reused
+        self.__rects, self.__last_rects = self.__last_rects, self.__rects
+        self.__rects.clear()
+        return updated
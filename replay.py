@@ -0,0 +1,243 @@
+import argparse, json, os, random, struct, sys, time, zlib
+from simulation import Match
+
+# Records the inputs of a match to a compact binary file and plays them back, seeking to any tick
+# A match is deterministic from its state, so the file keeps just one byte per step plus a full state keyframe every
+# keyframe_interval steps. Seeking restores the keyframe before the tick and steps the match headless up to it
+#
+# File layout (little endian):
+#   header: magic, version, keyframe interval, length of the JSON meta, JSON meta (seed and AI of both bars)
+#   chunks: magic, compressed size, steps in the chunk, zlib(keyframe + records)
+#   index: (first tick, file offset) of every chunk, then the footer: index offset, total ticks, end magic
+# If the game is closed without writing the index (a crash), the chunks are scanned from the header instead
+#
+# Records:
+#   step: bits 0-1 blue input, bits 2-3 red input (0 AI, 1 up, 2 stay, 3 down)
+#   command: 0x80 | SERVE or RESET, it's applied before the next step, like the game does
+
+MAGIC = b'PRPL'
+CHUNK_MAGIC = b'PRPC'
+END_MAGIC = b'PRPX'
+VERSION = 1
+KEYFRAME_INTERVAL = 60 * 30 # Steps between keyframes, seeking never steps more than these
+
+COMMAND = 0x80
+SERVE = 1
+RESET = 2
+
+HEADER = struct.Struct('<4sBII')
+CHUNK = struct.Struct('<4sII')
+INDEX_ENTRY = struct.Struct('<IQ')
+FOOTER = struct.Struct('<QI4s')
+# time, ball (x, y, vx, vy, hit_count), then (y, target_point, score, error) of the blue and red bars
+KEYFRAME = struct.Struct('<I4dI' + 'ddIi' * 2)
+RNG_STATE = struct.Struct('<625I?d') # Mersenne Twister words and position, then the cached gauss value
+
+def encode_input(player_input) -> int:
+    return 0 if player_input is None else player_input + 2
+
+def decode_input(code: int):
+    return None if code == 0 else code - 2
+
+# The whole state of a match that changes while it's played, the AI parameters are in the file meta
+def pack_state(match: Match) -> bytes:
+    ball, blue, red = match.ball, match.blue_bar, match.red_bar
+    version, words, gauss = match.rng.getstate()
+    return KEYFRAME.pack(match.time, ball.x, ball.y, ball.vx, ball.vy, ball.hit_count,
+        blue.y, blue.target_point, blue.score, blue.error,
+        red.y, red.target_point, red.score, red.error) + RNG_STATE.pack(*words, gauss is not None, gauss or 0.0)
+
+# Returns how many bytes of data were read
+def unpack_state(match: Match, data: bytes, offset: int = 0) -> int:
+    ball, blue, red = match.ball, match.blue_bar, match.red_bar
+    (match.time, ball.x, ball.y, ball.vx, ball.vy, ball.hit_count,
+        blue.y, blue.target_point, blue.score, blue.error,
+        red.y, red.target_point, red.score, red.error) = KEYFRAME.unpack_from(data, offset)
+    state = RNG_STATE.unpack_from(data, offset + KEYFRAME.size)
+    match.rng.setstate((3, state[:625], state[626] if state[625] else None))
+    return KEYFRAME.size + RNG_STATE.size
+
+# Applies a record to the match, returns True if it was a step
+def apply_record(match: Match, record: int) -> bool:
+    if record & COMMAND:
+        if record & 0x7f == SERVE:
+            match.serve()
+        elif record & 0x7f == RESET:
+            match.reset()
+        return False
+    match.step(decode_input(record & 3), decode_input(record >> 2 & 3))
+    return True
+
+# Moves the replay at path (if any) to <name>.1<ext>, so the next recording doesn't overwrite it
+def keep_previous(path: str):
+    if os.path.isfile(path):
+        name, ext = os.path.splitext(path)
+        os.replace(path, f'{name}.1{ext}')
+
+# Drive the match through the recorder (step, serve and reset) instead of calling it straight
+class ReplayRecorder:
+    def __init__(self, path: str, match: Match, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.match = match
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0 # Steps recorded
+        self.__file = open(path, 'wb')
+        self.__index = [] # (first tick, offset) of every chunk written
+        self.__keyframe = None # State before the first record of the current chunk
+        self.__records = bytearray()
+        self.__steps = 0 # Steps in the current chunk
+
+        meta = json.dumps({'seed': match.seed, 'blue_ai': match.blue_bar.ai, 'red_ai': match.red_bar.ai}).encode()
+        self.__file.write(HEADER.pack(MAGIC, VERSION, keyframe_interval, len(meta)) + meta)
+
+    def step(self, blue_input: int = None, red_input: int = None):
+        self.__begin_chunk()
+        self.__records.append(encode_input(blue_input) | encode_input(red_input) << 2)
+        self.match.step(blue_input, red_input)
+        self.ticks += 1
+        self.__steps += 1
+        if self.__steps == self.keyframe_interval:
+            self.__write_chunk()
+
+    def serve(self):
+        self.__begin_chunk()
+        self.__records.append(COMMAND | SERVE)
+        self.match.serve()
+
+    def reset(self):
+        self.__begin_chunk()
+        self.__records.append(COMMAND | RESET)
+        self.match.reset()
+
+    # Writes what is left and the index, the recorder can't be used after it
+    def close(self):
+        if self.__file.closed:
+            return
+        if self.__records: # Commands after the last step are written too, a chunk may have no steps
+            self.__write_chunk()
+        index_offset = self.__file.tell()
+        for entry in self.__index:
+            self.__file.write(INDEX_ENTRY.pack(*entry))
+        self.__file.write(FOOTER.pack(index_offset, self.ticks, END_MAGIC))
+        self.__file.close()
+
+    def __begin_chunk(self):
+        if self.__keyframe is None:
+            self.__keyframe = pack_state(self.match)
+
+    def __write_chunk(self):
+        data = zlib.compress(self.__keyframe + self.__records, 9)
+        self.__index.append((self.ticks - self.__steps, self.__file.tell()))
+        self.__file.write(CHUNK.pack(CHUNK_MAGIC, len(data), self.__steps) + data)
+        self.__file.flush() # A crash loses at most the current chunk
+        self.__keyframe = None
+        self.__records.clear()
+        self.__steps = 0
+
+class Replay:
+    def __init__(self, path: str):
+        with open(path, 'rb') as replay_file:
+            self.__data = replay_file.read()
+        data = self.__data
+
+        magic, version, self.keyframe_interval, meta_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} replay')
+        meta = json.loads(data[HEADER.size:HEADER.size + meta_size])
+        self.seed = meta['seed']
+        self.blue_ai = meta['blue_ai']
+        self.red_ai = meta['red_ai']
+
+        self.__chunks = [] # (first tick, offset)
+        index_offset, self.ticks, end_magic = FOOTER.unpack_from(data, len(data) - FOOTER.size) if len(data) >= FOOTER.size else (0, 0, b'')
+        if end_magic == END_MAGIC:
+            for offset in range(index_offset, len(data) - FOOTER.size, INDEX_ENTRY.size):
+                self.__chunks.append(INDEX_ENTRY.unpack_from(data, offset))
+        else: # No index, every complete chunk is found from the header
+            offset = HEADER.size + meta_size
+            self.ticks = 0
+            while offset + CHUNK.size <= len(data):
+                magic, size, steps = CHUNK.unpack_from(data, offset)
+                if magic != CHUNK_MAGIC or offset + CHUNK.size + size > len(data):
+                    break
+                self.__chunks.append((self.ticks, offset))
+                self.ticks += steps
+                offset += CHUNK.size + size
+
+        self.__cached = (None, None) # The last chunk decompressed, playing forward reads the same one many times
+
+    # A match in the state right after the given step (0 is the start of the replay)
+    def seek(self, tick: int) -> Match:
+        return self.__seek(tick)[0]
+
+    # Yields the match after each step, from the given tick to the end (it's the same Match, updated in place)
+    def play(self, start: int = 0):
+        match, chunk, offset = self.__seek(start)
+        yield match
+        while chunk < len(self.__chunks):
+            data = self.__chunk(chunk)[1]
+            for i in range(offset, len(data)):
+                if apply_record(match, data[i]):
+                    yield match
+            chunk += 1
+            offset = KEYFRAME.size + RNG_STATE.size # The match is already in the state of the next keyframe
+
+    # Returns the match, the chunk and the offset of the next record in it
+    def __seek(self, tick: int) -> tuple:
+        tick = min(max(tick, 0), self.ticks)
+        match = Match(self.seed, self.blue_ai, self.red_ai)
+        if not self.__chunks:
+            return match, 0, 0
+
+        chunk = min(tick // self.keyframe_interval, len(self.__chunks) - 1)
+        first_tick, data = self.__chunk(chunk)
+        offset = unpack_state(match, data)
+        steps = tick - first_tick
+        while steps > 0:
+            steps -= apply_record(match, data[offset])
+            offset += 1
+        return match, chunk, offset
+
+    def __chunk(self, chunk: int) -> tuple:
+        if self.__cached[0] != chunk:
+            first_tick, offset = self.__chunks[chunk]
+            size = CHUNK.unpack_from(self.__data, offset)[1]
+            self.__cached = (chunk, (first_tick, zlib.decompress(self.__data[offset + CHUNK.size:offset + CHUNK.size + size])))
+        return self.__cached[1]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shows a replay and times seeking in it')
+    parser.add_argument('path')
+    parser.add_argument('--record', type=float, metavar='MINUTES', help='first records a headless AI match this long into path')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the recorded match')
+    parser.add_argument('--seeks', type=int, default=200, help='random seeks to time')
+    parser.add_argument('--check', action='store_true', help='checks every timed seek against playing the replay from the start')
+    args = parser.parse_args()
+
+    if args.record is not None:
+        recorder = ReplayRecorder(args.path, Match(args.seed))
+        start = time.perf_counter()
+        for i in range(int(args.record * 60 * 60)):
+            recorder.step()
+        recorder.close()
+        print(f'recorded {recorder.ticks} ticks in {time.perf_counter() - start:.2f}s')
+
+    replay = Replay(args.path)
+    size = len(open(args.path, 'rb').read())
+    print(f'{replay.ticks} ticks ({replay.ticks / 3600:.1f} minutes), {size / 1024:.1f} KB, {size * 3600 * 60 / max(replay.ticks, 1) / 1024:.1f} KB per hour')
+
+    rng = random.Random(args.seed)
+    ticks = sorted(rng.randint(0, replay.ticks) for i in range(args.seeks))
+    times = []
+    states = {}
+    for tick in ticks:
+        start = time.perf_counter()
+        match = replay.seek(tick)
+        times.append(time.perf_counter() - start)
+        states[tick] = pack_state(match)
+    times.sort()
+    print(f'seek: mean {sum(times) / len(times) * 1000:.2f} ms, max {times[-1] * 1000:.2f} ms')
+
+    if args.check:
+        diverged = [tick for tick, match in enumerate(replay.play()) if tick in states and pack_state(match) != states[tick]]
+        print('seeks match the playback' if not diverged else f'seeks diverge at ticks {diverged[:10]}')
+        sys.exit(1 if diverged else 0)
@@ -0,0 +1,432 @@
+import bisect, math, random, struct
+
+# The rules of a match without any display, image or clock, so matches can be simulated headless
+# Every position is in pixels of the 200x150 pitch and every speed is in pixels per tick
+# Rects work like pygame.Rect: the position is truncated with int() and the center is position + size // 2
+
+FIELD_WIDTH = 200
+FIELD_HEIGHT = 150
+BALL_SIZE = 5
+BAR_WIDTH = 5
+BAR_HEIGHT = 25
+BALL_START = (98, 72)
+BALL_RESET = (98, 73) # Where a new match puts the ball
+BAR_START_Y = 63
+BLUE_BAR_X = 5
+RED_BAR_X = 190
+SERVE_SPEEDS = (-1.5, 1.5)
+TARGET_POINT = 74 # Where the bars wait for the ball after a serve
+WAIT_POINT = 75 # Where the AI goes while the ball is going away
+
+# error: the range the accuracy error is drawn from after each hit
+# reaction: how close (in x) the ball must be to make the AI go to the target point instead of following the ball
+# strategy: how the target point is chosen when the other bar hits the ball
+#   predict: where the ball will get, folding the bounces on the walls
+#   straight: where the ball would get without bouncing, limited to the pitch
+#   center: always the middle of the pitch
+DEFAULT_AI = {'error': (-8, 9), 'reaction': 70, 'strategy': 'predict'}
+
+# Difficulty levels, their bars are moved by a precomputed policy table (see PolicyTable and policy.py)
+DIFFICULTIES = {
+    'easy': {'error': (-14, 14), 'reaction': 70, 'strategy': 'predict', 'policy': 'easy'},
+    'normal': {'error': (-8, 9), 'reaction': 70, 'strategy': 'predict', 'policy': 'normal'},
+    'hard': {'error': (-4, 4), 'reaction': 70, 'strategy': 'predict', 'policy': 'hard'},
+    'expert': {'error': (-2, 2), 'reaction': 70, 'strategy': 'predict', 'policy': 'expert'},
+}
+
+# The ball bounces when its rect leaves the walls at y 1 and 149, so its top always comes back between these
+BALL_TOP_MIN = 1
+BALL_TOP_MAX = 149 - BALL_SIZE
+
+# Predicts the y of the ball center when its left side gets to target_x, in constant time
+# The bounces are folded with modulo arithmetic: the ball goes back and forth between the walls with a period of twice the gap
+# With bounces False the ball goes straight, limited to the pitch
+# Returns None when the ball isn't going to target_x
+def predict_arrival(x: float, y: float, vx: float, vy: float, target_x: float, bounces: bool = True):
+    if vx == 0:
+        return None
+    t = (target_x - x) / vx
+    if t < 0:
+        return None
+
+    gap = BALL_TOP_MAX - BALL_TOP_MIN
+    top = y + vy * t
+    if bounces:
+        top = (top - BALL_TOP_MIN) % (2 * gap)
+        if top > gap:
+            top = 2 * gap - top
+        top += BALL_TOP_MIN
+    else:
+        top = min(max(top, BALL_TOP_MIN), BALL_TOP_MAX)
+    return top + BALL_SIZE / 2
+
+# An AI policy table has the y a bar goes to for every quantized state of the ball, as seen from the bar:
+# whether it's coming, how many ticks until it gets to the front of the bar (or of the other bar, if it's going away),
+# the y of its top and its vy. The y of the bar itself is compared with the target at runtime, so it isn't in the table
+# The tables are built offline (python policy.py) with as much work as needed, a tick just does a lookup
+# File: header, the tick bucket edges (float32) and one byte per state with the target of the bar center
+POLICY_FOLDER = 'assets/ai'
+POLICY_MAGIC = b'PPOL'
+POLICY_VERSION = 1
+POLICY_HEADER = struct.Struct('<4sBBBBBff') # magic, version, tick buckets, y step, y buckets, vy buckets, vy step, vy max
+POLICY_FRONT_GAP = (RED_BAR_X - BALL_SIZE) - (BLUE_BAR_X + BAR_WIDTH) # Distance between the fronts of the bars
+
+class PolicyTable:
+    def __init__(self, data: bytes):
+        magic, version, t_count, self.y_step, self.y_count, self.vy_count, self.vy_step, self.vy_max = POLICY_HEADER.unpack_from(data)
+        if magic != POLICY_MAGIC or version != POLICY_VERSION:
+            raise ValueError('not a policy table of this version')
+        edges = struct.Struct(f'<{t_count - 1}f')
+        self.t_edges = edges.unpack_from(data, POLICY_HEADER.size)
+        self.t_count = t_count
+        self.targets = data[POLICY_HEADER.size + edges.size:]
+        if len(self.targets) != 2 * t_count * self.y_count * self.vy_count:
+            raise ValueError('truncated policy table')
+
+        # A lookup is on every tick of every AI bar, so each axis is turned into its offset in the table ahead:
+        # the edges are whole ticks, so int(t) finds the tick offset, and int(y) the y offset
+        vy_count, y_count = self.vy_count, self.y_count
+        self.__t_offsets = [bisect.bisect_right(self.t_edges, t) * y_count * vy_count for t in range(int(self.t_edges[-1]) + 1)]
+        self.__coming_offset = t_count * y_count * vy_count
+        self.__t_length = len(self.__t_offsets)
+        self.__y_offsets = [min(max((y - BALL_TOP_MIN) // self.y_step, 0), y_count - 1) * vy_count for y in range(FIELD_HEIGHT + 1)]
+        self.__vy_scale = 1 / self.vy_step
+        self.__vy_shift = self.vy_max / self.vy_step + 0.5
+
+    # Position of a state in the table
+    def index(self, coming: bool, t: float, y: float, vy: float) -> int:
+        t_offsets = self.__t_offsets
+        t = int(t)
+        t_offset = t_offsets[t] if 0 <= t < len(t_offsets) else t_offsets[-1 if t > 0 else 0]
+        y = int(y)
+        y_offset = self.__y_offsets[y] if 0 <= y <= FIELD_HEIGHT else self.__y_offsets[-1 if y > 0 else 0]
+        vy_index = int(vy * self.__vy_scale + self.__vy_shift)
+        vy_index = vy_index if 0 <= vy_index < self.vy_count else (self.vy_count - 1 if vy_index > 0 else 0)
+        return (self.__coming_offset if coming else 0) + t_offset + y_offset + vy_index
+
+    # The y the center of the bar goes to
+    # Same as looking index() up, inlined: the calls and the clamps of the common case were most of the lookup time
+    def target(self, bar, ball) -> int:
+        side = bar.side
+        speed = ball.vx * side # abs(vx) when the ball is coming, -abs(vx) when it goes away
+        distance = ((bar.x - BALL_SIZE if side > 0 else bar.x + BAR_WIDTH) - ball.x) * side # To the front of the bar
+        if speed > 0:
+            t = int(distance / speed)
+            offset = self.__coming_offset
+        else:
+            t = int((POLICY_FRONT_GAP - distance) / (-speed if speed < -0.001 else 0.001)) # max() is a slow call
+            offset = 0
+        t_offsets = self.__t_offsets
+        offset += t_offsets[t] if 0 <= t < self.__t_length else t_offsets[-1 if t > 0 else 0]
+        y = int(ball.y)
+        offset += self.__y_offsets[y] if 0 <= y <= FIELD_HEIGHT else self.__y_offsets[-1 if y > 0 else 0]
+        vy_index = int(ball.vy * self.__vy_scale + self.__vy_shift)
+        return self.targets[offset + (vy_index if 0 <= vy_index < self.vy_count else (self.vy_count - 1 if vy_index > 0 else 0))]
+
+POLICIES = {} # Every loaded policy table, by name
+
+def load_policy(name: str, folder: str = POLICY_FOLDER) -> PolicyTable:
+    table = POLICIES.get(name)
+    if table is None:
+        with open(f'{folder}/{name}.policy', 'rb') as policy_file:
+            table = PolicyTable(policy_file.read())
+        POLICIES[name] = table
+    return table
+
+MAX_SWEEP_CONTACTS = 8 # Most contacts handled in a single sweep, the rest of the movement is dropped after these
+WALL = 'wall'
+
+# Time until the ball top gets to a wall, negative if it's already past it, None if it isn't moving in y
+def wall_contact_time(y: float, vy: float):
+    if vy < 0:
+        return (BALL_TOP_MIN - y) / vy
+    elif vy > 0:
+        return (BALL_TOP_MAX - y) / vy
+    return None
+
+# Swept AABB test: time until the moving ball rect starts overlapping the still rect (bx, by, bw, bh)
+# It's negative if they already overlap and None if they never do (touching edges don't count, like colliderect)
+def contact_time(x: float, y: float, vx: float, vy: float, bx: float, by: float, bw: float, bh: float):
+    if vx > 0:
+        x_entry = (bx - (x + BALL_SIZE)) / vx
+        x_exit = (bx + bw - x) / vx
+    elif vx < 0:
+        x_entry = (bx + bw - x) / vx
+        x_exit = (bx - (x + BALL_SIZE)) / vx
+    elif x + BALL_SIZE <= bx or x >= bx + bw:
+        return None
+    else:
+        x_entry = -math.inf
+        x_exit = math.inf
+
+    if vy > 0:
+        y_entry = (by - (y + BALL_SIZE)) / vy
+        y_exit = (by + bh - y) / vy
+    elif vy < 0:
+        y_entry = (by + bh - y) / vy
+        y_exit = (by - (y + BALL_SIZE)) / vy
+    elif y + BALL_SIZE <= by or y >= by + bh:
+        return None
+    else:
+        y_entry = -math.inf
+        y_exit = math.inf
+
+    entry = max(x_entry, y_entry)
+    if entry >= min(x_exit, y_exit):
+        return None
+    return entry
+
+# Same as pygame.Rect.colliderect for rects with positive sizes
+def overlaps(ax: int, ay: int, aw: int, ah: int, bx: int, by: int, bw: int, bh: int) -> bool:
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+class BallState:
+    __slots__ = ('x', 'y', 'vx', 'vy', 'hit_count')
+
+    def __init__(self, x: float, y: float, vx: float, vy: float):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.hit_count = 0 # Hits in the current rally, every 15 hits the ball gets faster
+
+class BarState:
+    __slots__ = ('name', 'x', 'y', 'side', 'ai', 'error', 'target_point', 'score', 'policy')
+
+    # side: -1 for the left bar (it defends when the ball goes left), 1 for the right one
+    def __init__(self, name: str, x: float, y: float, side: int, ai: dict, error: int):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.side = side
+        self.ai = ai
+        self.error = error # Accuracy error of the AI, it's drawn again after each hit
+        self.target_point = TARGET_POINT
+        self.score = 0
+        self.policy = load_policy(ai['policy']) if 'policy' in ai else None # Loaded once, every match shares it
+
+    # Where the left side of the ball is when it touches the front of the bar
+    def contact_x(self) -> float:
+        return self.x - BALL_SIZE if self.side > 0 else self.x + BAR_WIDTH
+
+    # Predicts the y where the ball will be when it gets to the bar, following the AI strategy
+    # If the ball isn't coming to the bar the target point stays the same
+    def update_target_point(self, ball: BallState) -> float:
+        strategy = self.ai.get('strategy', 'predict')
+        if strategy == 'center':
+            self.target_point = TARGET_POINT
+            return self.target_point
+
+        arrival = predict_arrival(ball.x, ball.y, ball.vx, ball.vy, self.contact_x(), strategy != 'straight')
+        if arrival is not None:
+            self.target_point = arrival
+
+        return self.target_point
+
+class Match:
+    # blue_ai and red_ai are the AI parameters of each bar (see DEFAULT_AI)
+    # seed makes the match deterministic, with None a new one is drawn, so every match can be played again from its seed
+    def __init__(self, seed = None, blue_ai: dict = None, red_ai: dict = None):
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.rng = random.Random(seed) # Every random draw of the match comes from here, never from the random module
+        self.ball = BallState(BALL_START[0], BALL_START[1], self.rng.choice(SERVE_SPEEDS), 0)
+        blue_ai = blue_ai or DEFAULT_AI
+        red_ai = red_ai or DEFAULT_AI
+        self.blue_bar = BarState('blue', BLUE_BAR_X, BAR_START_Y, -1, blue_ai, self.rng.randint(*blue_ai['error']))
+        self.red_bar = BarState('red', RED_BAR_X, BAR_START_Y, 1, red_ai, self.rng.randint(*red_ai['error']))
+        self.time = 0 # Ticks since the match started
+
+        # What happened in the last step, the game uses it to play the animations
+        self.wall_hit = False
+        self.bar_hit = None # The BarState hit by the ball
+        self.goal = None # The BarState that scored
+        self.goal_position = (0, 0) # Where the ball was when the goal happened
+
+    # Starts the match again
+    def reset(self):
+        ball = self.ball
+        ball.x, ball.y = BALL_RESET
+        ball.vx = self.rng.choice(SERVE_SPEEDS)
+        ball.vy = 0
+        ball.hit_count = 0
+        for bar in (self.blue_bar, self.red_bar):
+            bar.y = BAR_START_Y
+            bar.score = 0
+            bar.target_point = TARGET_POINT
+        self.time = 0
+
+    # Puts the ball in the middle going to a random side
+    def serve(self):
+        ball = self.ball
+        ball.x, ball.y = BALL_START
+        ball.vx = self.rng.choice(SERVE_SPEEDS)
+        ball.vy = 0
+
+    # Runs one tick of the match
+    # blue_input and red_input are the player movement of each bar (-1 up, 0 stay, 1 down), None lets the AI play
+    def step(self, blue_input: int = None, red_input: int = None):
+        ball = self.ball
+        self.wall_hit = False
+        self.bar_hit = None
+        self.goal = None
+
+        self.__move_bar(self.blue_bar, blue_input)
+        self.__move_bar(self.red_bar, red_input)
+
+        self.sweep(1)
+
+        # Checking for score
+
+        left = int(ball.x)
+        if left < 1:
+            self.__score(self.red_bar)
+        elif left + BALL_SIZE > 199:
+            self.__score(self.blue_bar)
+
+        # Updating the bar's AI target point
+
+        elif self.bar_hit is self.blue_bar:
+            self.red_bar.update_target_point(ball)
+        elif self.bar_hit is self.red_bar:
+            self.blue_bar.update_target_point(ball)
+
+        self.time += 1
+
+    # Moves the ball for duration ticks, bouncing on the walls and the bars at the exact time it touches them
+    # Every contact is found with a swept test, so the ball can't go through a bar no matter how fast it is
+    def sweep(self, duration: float):
+        ball = self.ball
+        remaining = duration
+        for i in range(MAX_SWEEP_CONTACTS):
+            t = remaining
+            contact = None
+
+            wall_time = wall_contact_time(ball.y, ball.vy)
+            if wall_time is not None and wall_time < t:
+                t = max(wall_time, 0)
+                contact = WALL
+
+            for bar in (self.blue_bar, self.red_bar):
+                if ball.vx * bar.side > 0: # Only a ball going to the bar can hit it
+                    bar_time = contact_time(ball.x, ball.y, ball.vx, ball.vy, bar.x, bar.y, BAR_WIDTH, BAR_HEIGHT)
+                    if bar_time is not None and bar_time < t:
+                        t = max(bar_time, 0)
+                        contact = bar
+
+            ball.x += ball.vx * t
+            ball.y += ball.vy * t
+            remaining -= t
+
+            if contact is None:
+                break
+            elif contact is WALL:
+                ball.vy = -ball.vy
+                self.wall_hit = True
+            else:
+                self.__hit(contact)
+
+    def __move_bar(self, bar: BarState, player_input: int):
+        if player_input is not None: # Player control system
+            bar.y += player_input
+        else:
+            bar.y += self.ai_movement(bar)
+
+    # The movement the AI picks for the bar this tick (-1 up, 1 down, 0 stays), without moving it
+    def ai_movement(self, bar: BarState) -> int:
+        ball = self.ball
+
+        if bar.policy is not None: # Precomputed IA, a lookup no matter how smart it is
+            aim = bar.policy.target(bar, ball) - (int(bar.y) + BAR_HEIGHT // 2 + bar.error)
+            return (aim > 0) - (aim < 0)
+
+        # IA control system
+        center_y = int(bar.y) + BAR_HEIGHT // 2
+        if ball.vx * bar.side > 0: # The ball is coming
+            delta_y = int(ball.y) + BALL_SIZE // 2 - center_y + bar.error # Gets to where the ball is going
+            delta_x = int(ball.x) + BALL_SIZE // 2 - (int(bar.x) + BAR_WIDTH // 2)
+            reaction = bar.ai['reaction']
+
+            if delta_x > -reaction and delta_x < reaction:
+                if bar.target_point > center_y + bar.error:
+                    return 1
+                elif bar.target_point < center_y + bar.error:
+                    return -1
+            else:
+                if delta_y > 0:
+                    return 1
+                elif delta_y < 0:
+                    return -1
+        else:
+            if center_y > WAIT_POINT + bar.error:
+                return -1
+            elif center_y < WAIT_POINT + bar.error:
+                return 1
+        return 0
+
+    def __hit(self, bar: BarState):
+        ball = self.ball
+        ball.vx *= -1
+        delta_y = (int(ball.y) - BALL_SIZE / 2 - 32.5) - (int(bar.y) - BAR_HEIGHT / 2 - 12.5)
+        ball.vy += delta_y / 12 # Sets the ball movement
+
+        if ball.vx > 0:
+            ball.vx += int(ball.hit_count / 15) / 2
+        elif ball.vx < 0:
+            ball.vx -= int(ball.hit_count / 15) / 2
+
+        bar.error = self.rng.randint(*bar.ai['error'])
+
+        self.bar_hit = bar
+        ball.hit_count += 1 # Counter to increase the ball speed
+
+    def __score(self, bar: BarState):
+        ball = self.ball
+        self.goal = bar
+        self.goal_position = (int(ball.x), int(ball.y))
+        bar.score += 1
+        self.blue_bar.target_point = TARGET_POINT
+        self.red_bar.target_point = TARGET_POINT
+        self.serve()
+        ball.hit_count = 0
+
+# Simulates a whole match headless and returns what happened in it
+# ai_params is the AI of both bars or a (blue, red) pair, the match ends after max_ticks or when a bar gets max_score
+def simulate(seed: int, ai_params = None, max_ticks: int = 60 * 60 * 5, max_score: int = None) -> dict:
+    if ai_params is None or isinstance(ai_params, dict):
+        blue_ai = red_ai = ai_params
+    else:
+        blue_ai, red_ai = ai_params
+
+    match = Match(seed, blue_ai, red_ai)
+    hits = 0
+    rally_hits = 0
+    longest_rally = 0
+    rally_start = 0
+    rally_ticks = 0
+
+    while match.time < max_ticks:
+        match.step()
+        if match.bar_hit is not None:
+            hits += 1
+            rally_hits += 1
+        if match.goal is not None:
+            longest_rally = max(longest_rally, rally_hits)
+            rally_hits = 0
+            rally_ticks += match.time - rally_start
+            rally_start = match.time
+            if max_score is not None and match.goal.score >= max_score:
+                break
+
+    points = match.blue_bar.score + match.red_bar.score
+    return {
+        'seed': seed,
+        'ticks': match.time,
+        'blue_score': match.blue_bar.score,
+        'red_score': match.red_bar.score,
+        'hits': hits,
+        'longest_rally': max(longest_rally, rally_hits),
+        'rally_ticks': rally_ticks, # Ticks of the rallies that ended in a point
+        'mean_rally_ticks': rally_ticks / points if points else float(match.time),
+    }
@@ -0,0 +1,303 @@
+import argparse, asyncio, multiprocessing, struct, time
+from simulation import Match
+
+# Spectator server: runs the authoritative match and broadcasts its state to any number of spectators over UDP
+# Every snapshot is quantized to the 200x150 pitch and sent as a delta against the last snapshot the spectator acked,
+# so a spectator that keeps up gets just the few fields that changed. Spectators acking the same snapshot share one encoded packet
+#
+# Packets:
+#   spectator -> server: HELLO (join), ACK + snapshot number, BYE
+#   server -> spectator: SNAPSHOT + snapshot number + baseline number (NO_BASELINE for a full one) + delta
+# Delta: a bit mask of the changed fields, then the difference of each changed field as a zigzag varint
+
+HELLO = b'H'
+ACK = b'A'
+BYE = b'B'
+SNAPSHOT = b'S'
+SNAPSHOT_HEADER = struct.Struct('<cII')
+ACK_PACKET = struct.Struct('<cI')
+NO_BASELINE = 0xffffffff
+
+TICK_RATE = 60
+SNAPSHOT_RATE = 30 # Snapshots per second, the spectators interpolate between them
+POSITION_SCALE = 4 # Positions are sent in quarter pixels, a pixel of the 800x600 window
+SPEED_SCALE = 256
+PARTICLE_TICKS = 40 # A score particle plays its 20 frames twice (assets/entities/score)
+MAX_PARTICLES = 8
+HISTORY = 64 # Snapshots kept as baselines, a spectator that acked an older one gets a full snapshot
+CLIENT_TIMEOUT = 5 # Seconds without an ack before a spectator is dropped
+
+# time, ball x, y, vx, vy, blue y, red y, blue score, red score, particle count, then x, y, age of each particle
+FIELDS = 10 + 3 * MAX_PARTICLES
+MASK_SIZE = (FIELDS + 7) // 8
+ZERO_SNAPSHOT = [0] * FIELDS # Baseline of the full snapshots
+
+# Integer fields of a snapshot, particles is a list of [x, y, age]
+def quantize(match: Match, particles: list) -> list:
+    ball = match.ball
+    fields = [
+        match.time,
+        round(ball.x * POSITION_SCALE), round(ball.y * POSITION_SCALE),
+        round(ball.vx * SPEED_SCALE), round(ball.vy * SPEED_SCALE),
+        round(match.blue_bar.y * POSITION_SCALE), round(match.red_bar.y * POSITION_SCALE),
+        match.blue_bar.score, match.red_bar.score,
+        len(particles),
+    ]
+    for x, y, age in particles:
+        fields.extend((x * POSITION_SCALE, y * POSITION_SCALE, age))
+    fields.extend(ZERO_SNAPSHOT[len(fields):])
+    return fields
+
+# The snapshot fields back in pitch units
+def dequantize(fields: list) -> dict:
+    return {
+        'time': fields[0],
+        'ball': (fields[1] / POSITION_SCALE, fields[2] / POSITION_SCALE, fields[3] / SPEED_SCALE, fields[4] / SPEED_SCALE),
+        'blue_y': fields[5] / POSITION_SCALE,
+        'red_y': fields[6] / POSITION_SCALE,
+        'blue_score': fields[7],
+        'red_score': fields[8],
+        'particles': [(fields[i] / POSITION_SCALE, fields[i + 1] / POSITION_SCALE, fields[i + 2]) for i in range(10, 10 + 3 * fields[9], 3)],
+    }
+
+def encode_delta(fields: list, baseline: list) -> bytes:
+    mask = 0
+    values = bytearray()
+    for i in range(FIELDS):
+        delta = fields[i] - baseline[i]
+        if delta:
+            mask |= 1 << i
+            value = delta << 1 if delta > 0 else (-delta << 1) - 1 # Zigzag, small negative numbers stay small
+            while value >= 0x80:
+                values.append(value & 0x7f | 0x80)
+                value >>= 7
+            values.append(value)
+    return mask.to_bytes(MASK_SIZE, 'little') + values
+
+def decode_delta(data: bytes, offset: int, baseline: list) -> list:
+    mask = int.from_bytes(data[offset:offset + MASK_SIZE], 'little')
+    offset += MASK_SIZE
+    fields = list(baseline)
+    for i in range(FIELDS):
+        if mask >> i & 1:
+            value = 0
+            shift = 0
+            while True:
+                byte = data[offset]
+                offset += 1
+                value |= (byte & 0x7f) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            fields[i] += value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
+    return fields
+
+class SpectatorServer(asyncio.DatagramProtocol):
+    def __init__(self, match: Match, snapshot_rate: int = SNAPSHOT_RATE):
+        self.match = match
+        self.ticks_per_snapshot = max(TICK_RATE // snapshot_rate, 1)
+        self.particles = [] # [x, y, age] of the living score particles
+        self.spectators = {} # address: [last acked snapshot, time of the last packet]
+        self.__history = {} # snapshot number: fields
+        self.__sequence = 0
+        self.__transport = None
+
+        # Stats
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.encodes = 0 # Deltas encoded, fewer than the packets when spectators share a baseline
+        self.late_ticks = 0 # Ticks simulated behind their time
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+    def datagram_received(self, data: bytes, address: tuple):
+        kind = data[:1]
+        if kind == ACK and len(data) == ACK_PACKET.size:
+            spectator = self.spectators.get(address)
+            if spectator is not None:
+                sequence = ACK_PACKET.unpack(data)[1]
+                if spectator[0] is None or sequence > spectator[0]:
+                    spectator[0] = sequence
+                spectator[1] = time.monotonic()
+        elif kind == HELLO:
+            self.spectators[address] = [None, time.monotonic()]
+        elif kind == BYE:
+            self.spectators.pop(address, None)
+
+    # Plays the match in real time, for the given seconds or forever
+    async def run(self, seconds: float = None):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tick = 0
+        while seconds is None or tick < seconds * TICK_RATE:
+            self.step()
+            tick += 1
+            if tick % self.ticks_per_snapshot == 0:
+                self.broadcast()
+
+            delay = start + tick / TICK_RATE - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                self.late_ticks += 1
+                await asyncio.sleep(0) # Lets the acks in even when it's behind
+
+    def step(self):
+        match = self.match
+        match.step()
+
+        particles = self.particles
+        for particle in particles:
+            particle[2] += 1
+        particles[:] = [particle for particle in particles if particle[2] < PARTICLE_TICKS]
+        if match.goal is not None and len(particles) < MAX_PARTICLES: # Same place the game draws it
+            particles.append([match.goal_position[0] - 11, match.goal_position[1] - 11, 0])
+
+    def broadcast(self):
+        self.__sequence += 1
+        sequence = self.__sequence
+        fields = quantize(self.match, self.particles)
+        history = self.__history
+        history[sequence] = fields
+        history.pop(sequence - HISTORY, None)
+
+        now = time.monotonic()
+        packets = {} # baseline: packet, most spectators acked the same snapshot
+        for address, (acked, last_seen) in list(self.spectators.items()):
+            if now - last_seen > CLIENT_TIMEOUT:
+                del self.spectators[address]
+                continue
+            baseline = acked if acked in history else NO_BASELINE
+            packet = packets.get(baseline)
+            if packet is None:
+                packet = SNAPSHOT_HEADER.pack(SNAPSHOT, sequence, baseline) + encode_delta(fields, history.get(baseline, ZERO_SNAPSHOT))
+                packets[baseline] = packet
+                self.encodes += 1
+            self.__transport.sendto(packet, address)
+            self.bytes_sent += len(packet)
+            self.packets_sent += 1
+
+class SpectatorClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.latest = None # Fields of the newest snapshot
+        self.latest_sequence = 0
+        self.__history = {} # snapshot number: fields, the baselines the server may use
+        self.__transport = None
+
+        # Stats
+        self.bytes_received = 0
+        self.snapshots = 0
+        self.undecodable = 0 # Deltas against a baseline that was never received
+
+    def connection_made(self, transport):
+        self.__transport = transport
+        transport.sendto(HELLO)
+
+    def datagram_received(self, data: bytes, address: tuple):
+        if data[:1] != SNAPSHOT or len(data) < SNAPSHOT_HEADER.size:
+            return
+        self.bytes_received += len(data)
+        kind, sequence, baseline = SNAPSHOT_HEADER.unpack_from(data)
+        if sequence <= self.latest_sequence:
+            return # Late or repeated, a newer one is already shown
+        baseline_fields = ZERO_SNAPSHOT if baseline == NO_BASELINE else self.__history.get(baseline)
+        if baseline_fields is None:
+            self.undecodable += 1
+            return
+
+        fields = decode_delta(data, SNAPSHOT_HEADER.size, baseline_fields)
+        self.__history[sequence] = fields
+        self.__history.pop(sequence - HISTORY, None)
+        self.latest = fields
+        self.latest_sequence = sequence
+        self.snapshots += 1
+        self.__transport.sendto(ACK_PACKET.pack(ACK, sequence))
+
+    def state(self) -> dict:
+        return dequantize(self.latest) if self.latest is not None else None
+
+    def close(self):
+        self.__transport.sendto(BYE)
+        self.__transport.close()
+
+async def serve(host: str, port: int, seconds: float = None, seed = None, ready = None) -> SpectatorServer:
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: SpectatorServer(Match(seed)), local_addr=(host, port))
+    if ready is not None:
+        ready(transport.get_extra_info('sockname'))
+    try:
+        await server.run(seconds)
+    finally:
+        transport.close()
+    return server
+
+# Runs the server in its own process so its CPU time isn't mixed with the spectators'
+def load_server(port_queue, stats_queue, seconds: float, seed):
+    cpu_start = time.process_time()
+    server = asyncio.run(serve('127.0.0.1', 0, seconds, seed, lambda address: port_queue.put(address[1])))
+    stats_queue.put({
+        'cpu_seconds': time.process_time() - cpu_start,
+        'bytes_sent': server.bytes_sent,
+        'packets_sent': server.packets_sent,
+        'encodes': server.encodes,
+        'late_ticks': server.late_ticks,
+        'full_snapshot_bytes': SNAPSHOT_HEADER.size + len(encode_delta(quantize(server.match, server.particles), ZERO_SNAPSHOT)),
+    })
+
+async def load_spectators(port: int, spectators: int, seconds: float) -> list:
+    loop = asyncio.get_running_loop()
+    clients = []
+    for i in range(spectators):
+        transport, client = await loop.create_datagram_endpoint(SpectatorClient, remote_addr=('127.0.0.1', port))
+        clients.append(client)
+    await asyncio.sleep(seconds)
+    for client in clients:
+        client.close()
+    return clients
+
+# Load generator: a server and the given number of spectators for some seconds, returns what it cost per spectator
+def run_load(spectators: int, seconds: float = 10, seed = 0) -> dict:
+    port_queue = multiprocessing.Queue()
+    stats_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=load_server, args=(port_queue, stats_queue, seconds + 1, seed))
+    server.start()
+    port = port_queue.get()
+    clients = asyncio.run(load_spectators(port, spectators, seconds))
+    stats = stats_queue.get()
+    server.join()
+
+    received = sum(client.bytes_received for client in clients)
+    snapshots = sum(client.snapshots for client in clients)
+    return {
+        'spectators': spectators,
+        'seconds': seconds,
+        'bytes_per_spectator_per_second': received / spectators / seconds,
+        'mean_snapshot_bytes': received / max(snapshots, 1),
+        'full_snapshot_bytes': stats['full_snapshot_bytes'],
+        'snapshots_per_spectator_per_second': snapshots / spectators / seconds,
+        'undecodable': sum(client.undecodable for client in clients),
+        'server_cpu_percent': stats['cpu_seconds'] / (seconds + 1) * 100,
+        'cpu_us_per_spectator_per_second': stats['cpu_seconds'] / (seconds + 1) / spectators * 1e6,
+        'packets_per_encode': stats['packets_sent'] / max(stats['encodes'], 1),
+        'server_late_ticks': stats['late_ticks'],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spectator server for a headless match, and a load generator for it')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='runs an AI match and serves it to spectators')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=7777)
+    serve_parser.add_argument('--seed', type=int)
+    load_parser = commands.add_parser('load', help='measures a local server with many spectators')
+    load_parser.add_argument('--spectators', type=int, default=300)
+    load_parser.add_argument('--seconds', type=float, default=10)
+    load_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port, seed=args.seed, ready=lambda address: print(f'serving on {address[0]}:{address[1]}')))
+    else:
+        for key, value in run_load(args.spectators, args.seconds, args.seed).items():
+            print(f'{key:>36}: {value:.2f}' if isinstance(value, float) else f'{key:>36}: {value}')
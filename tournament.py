@@ -0,0 +1,143 @@
+import argparse, csv, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from simulation import simulate, DIFFICULTIES
+
+# Round robin tournaments between AI configurations, every match is simulated headless in a pool of processes
+# Each match seed is made of the tournament seed, the pair and the match number, and the results are gathered in the job order,
+# so a tournament gives the same table no matter how many workers run it
+
+TICKS_PER_MINUTE = 60 * 60
+
+# Named AI configurations (see simulation.DEFAULT_AI)
+AI_CONFIGS = {
+    'normal': {'error': (-8, 9), 'reaction': 70, 'strategy': 'predict'},
+    'sharp': {'error': (-3, 3), 'reaction': 90, 'strategy': 'predict'},
+    'sloppy': {'error': (-12, 12), 'reaction': 50, 'strategy': 'predict'},
+    'straight': {'error': (-8, 9), 'reaction': 70, 'strategy': 'straight'},
+    'center': {'error': (-8, 9), 'reaction': 70, 'strategy': 'center'},
+    **{f'policy-{name}': ai for name, ai in DIFFICULTIES.items()}, # The policy table levels
+}
+
+# Every match of the tournament: each pair plays matches_per_pair matches, swapping the sides on every other match
+def make_jobs(configs: dict, seed: int, matches_per_pair: int, max_ticks: int, max_score: int) -> list:
+    names = sorted(configs)
+    jobs = []
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            for k in range(matches_per_pair):
+                blue, red = (names[i], names[j]) if k % 2 == 0 else (names[j], names[i])
+                match_seed = f'{seed}/{names[i]}/{names[j]}/{k}' # random.Random hashes str seeds the same way in every process
+                jobs.append((match_seed, blue, red, configs[blue], configs[red], max_ticks, max_score))
+    return jobs
+
+def play(job: tuple) -> tuple:
+    match_seed, blue, red, blue_ai, red_ai, max_ticks, max_score = job
+    return blue, red, simulate(match_seed, (blue_ai, red_ai), max_ticks, max_score)
+
+# Sums the results of every configuration, win_rate counts a draw as half a win
+def aggregate(results: list) -> list:
+    table = {}
+    for blue, red, result in results:
+        for name, scored, conceded in ((blue, result['blue_score'], result['red_score']), (red, result['red_score'], result['blue_score'])):
+            row = table.setdefault(name, {'ai': name, 'matches': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'points_for': 0, 'points_against': 0, 'hits': 0, 'ticks': 0, 'rally_ticks': 0, 'longest_rally': 0})
+            row['matches'] += 1
+            row['wins'] += scored > conceded
+            row['draws'] += scored == conceded
+            row['losses'] += scored < conceded
+            row['points_for'] += scored
+            row['points_against'] += conceded
+            row['hits'] += result['hits']
+            row['ticks'] += result['ticks']
+            row['rally_ticks'] += result['rally_ticks'] # A match without points adds no rally
+            row['longest_rally'] = max(row['longest_rally'], result['longest_rally'])
+
+    rows = []
+    for row in table.values():
+        points = row['points_for'] + row['points_against']
+        rows.append({
+            'ai': row['ai'],
+            'matches': row['matches'],
+            'wins': row['wins'],
+            'draws': row['draws'],
+            'losses': row['losses'],
+            'win_rate': (row['wins'] + row['draws'] / 2) / row['matches'],
+            'points_for': row['points_for'],
+            'points_against': row['points_against'],
+            'mean_rally_hits': row['hits'] / max(points, 1),
+            'mean_rally_ticks': row['rally_ticks'] / max(points, 1),
+            'longest_rally': row['longest_rally'],
+            'points_per_minute': points / (row['ticks'] / TICKS_PER_MINUTE) if row['ticks'] else 0.0,
+        })
+    rows.sort(key=lambda row: (-row['win_rate'], row['ai']))
+    return rows
+
+# Plays the whole tournament and returns the results table
+def run_tournament(configs: dict, seed: int = 0, matches_per_pair: int = 20, max_ticks: int = 60 * 60 * 5, max_score: int = 11, workers: int = None) -> list:
+    jobs = make_jobs(configs, seed, matches_per_pair, max_ticks, max_score)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = list(map(play, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            # map keeps the job order, so the sums are done in the same order no matter which worker played each match
+            results = list(pool.map(play, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    return aggregate(results)
+
+def print_table(rows: list):
+    print(f"{'ai':<14} {'matches':>7} {'W':>4} {'D':>4} {'L':>4} {'win %':>6} {'for':>5} {'agst':>5} {'hits/pt':>7} {'ticks/pt':>8} {'best':>4} {'pts/min':>7}")
+    for row in rows:
+        print(f"{row['ai']:<14} {row['matches']:>7} {row['wins']:>4} {row['draws']:>4} {row['losses']:>4} {row['win_rate'] * 100:>6.1f} "
+            f"{row['points_for']:>5} {row['points_against']:>5} {row['mean_rally_hits']:>7.2f} {row['mean_rally_ticks']:>8.1f} {row['longest_rally']:>4} {row['points_per_minute']:>7.2f}")
+
+# Times the same tournament with 1 to max_workers processes, returns (workers, seconds, speedup) for each
+# Every run must give the same table, so the speedup is for the exact same work
+def measure_scaling(configs: dict, seed: int, matches_per_pair: int, max_ticks: int, max_score: int, max_workers: int) -> list:
+    timings = []
+    baseline_rows = None
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        rows = run_tournament(configs, seed, matches_per_pair, max_ticks, max_score, workers)
+        seconds = time.perf_counter() - start
+        if baseline_rows is None:
+            baseline_rows = rows
+        elif rows != baseline_rows:
+            raise RuntimeError(f'the table with {workers} workers differs from the one with 1')
+        timings.append((workers, seconds, timings[0][1] / seconds if timings else 1.0))
+    return timings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a round robin tournament between AI configurations')
+    parser.add_argument('--configs', help='JSON file with {name: ai params}, the built-in AI_CONFIGS by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--matches', type=int, default=20, help='matches for each pair of configurations')
+    parser.add_argument('--max-ticks', type=int, default=60 * 60 * 5)
+    parser.add_argument('--max-score', type=int, default=11)
+    parser.add_argument('--workers', type=int, default=None, help='processes in the pool, every core by default')
+    parser.add_argument('--csv', help='also writes the table to this CSV file')
+    parser.add_argument('--scaling', type=int, nargs='?', const=os.cpu_count(), metavar='MAX_WORKERS',
+        help='times the tournament with 1 to MAX_WORKERS processes (every core by default) and reports the speedup')
+    args = parser.parse_args()
+
+    configs = AI_CONFIGS
+    if args.configs:
+        with open(args.configs) as configs_file:
+            configs = json.load(configs_file)
+
+    if args.scaling:
+        print(f'{"workers":>7} {"seconds":>8} {"speedup":>8} {"efficiency":>10}')
+        for workers, seconds, speedup in measure_scaling(configs, args.seed, args.matches, args.max_ticks, args.max_score, args.scaling):
+            print(f'{workers:>7} {seconds:>8.2f} {speedup:>7.2f}x {speedup / workers * 100:>9.0f}%')
+        sys.exit(0)
+
+    start = time.perf_counter()
+    rows = run_tournament(configs, args.seed, args.matches, args.max_ticks, args.max_score, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print_table(rows)
+    print(f'{len(configs) * (len(configs) - 1) // 2 * args.matches} matches in {elapsed:.2f}s', file=sys.stderr)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
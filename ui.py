@@ -0,0 +1,86 @@
+import pygame
+from pygame.locals import MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP
+
+# Routes the mouse events of the event loop to the widgets of a screen, nothing is polled each frame
+# A widget is anything with a rect (in the low resolution surface) and these methods:
+#   enter() and leave(): the mouse got over it or left it
+#   press(): the left button went down over it
+#   release(inside): the left button went up after pressing it, inside tells whether it's still over it (a click)
+# A click only happens on the widget that got the press, so a held button never clicks again or clicks what shows
+# up under it after a screen change
+#
+# The widgets are indexed by the grid cells their rects touch, so finding the one under the mouse only tests the few
+# widgets of a cell, no matter how many the screen has
+
+CELL_SIZE = 16 # In pixels of the low resolution surface
+MOUSE_EVENTS = (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP)
+
+class UiDispatcher:
+    # scale: window pixels per pixel of the low resolution surface, to convert the event positions
+    def __init__(self, scale: tuple = (1, 1), cell_size: int = CELL_SIZE):
+        self.__scale = scale
+        self.__cell_size = cell_size
+        self.__cells = {} # (column, row): widgets touching the cell, the last added is on top
+        self.hovered = None
+        self.pressed = None
+
+    # Call it again (after remove) if the widget rect changes
+    def add(self, widget):
+        for cell in self.__cells_of(widget.rect):
+            self.__cells.setdefault(cell, []).append(widget)
+
+    def remove(self, widget):
+        for cell in self.__cells_of(widget.rect):
+            self.__cells[cell].remove(widget)
+        if self.hovered is widget:
+            self.hovered = None
+        if self.pressed is widget:
+            self.pressed = None
+
+    # The top widget at a position of the low resolution surface, or None
+    def widget_at(self, position: tuple):
+        cell = (position[0] // self.__cell_size, position[1] // self.__cell_size)
+        for widget in reversed(self.__cells.get(cell, ())):
+            if widget.rect.collidepoint(position):
+                return widget
+        return None
+
+    # Handles a pygame event, returns True if it was a mouse event over a widget
+    def handle(self, event) -> bool:
+        if event.type not in MOUSE_EVENTS:
+            return False
+        widget = self.widget_at((event.pos[0] // self.__scale[0], event.pos[1] // self.__scale[1]))
+        self.__hover(widget)
+
+        if event.type == MOUSEBUTTONDOWN and event.button == 1:
+            if widget is not None:
+                self.pressed = widget
+                widget.press()
+        elif event.type == MOUSEBUTTONUP and event.button == 1:
+            if self.pressed is not None:
+                pressed = self.pressed
+                self.pressed = None
+                pressed.release(pressed is widget)
+        return widget is not None
+
+    # Forgets the hover and the press, call it when the screen is hidden or shown
+    # With the window position of the mouse, the widget under it is hovered right away, without waiting for it to move
+    def reset(self, mouse_position: tuple = None):
+        self.pressed = None
+        widget = None
+        if mouse_position is not None:
+            widget = self.widget_at((mouse_position[0] // self.__scale[0], mouse_position[1] // self.__scale[1]))
+        self.__hover(widget)
+
+    def __hover(self, widget):
+        if widget is not self.hovered:
+            if self.hovered is not None:
+                self.hovered.leave()
+            self.hovered = widget
+            if widget is not None:
+                widget.enter()
+
+    def __cells_of(self, rect: pygame.Rect) -> list:
+        size = self.__cell_size
+        return [(column, row) for column in range(rect.left // size, (rect.right - 1) // size + 1)
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1)]